@@ -1,4 +1,6 @@
-from copy import deepcopy
+import hashlib
+import json
+from threading import RLock
 
 from collections import namedtuple, defaultdict
 try:
@@ -6,11 +8,85 @@ try:
 except ImportError:
     from collections.abc import Mapping
 
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .app_settings import settings
+
 PROPERTY = 1
 GETTER = 0
 MetaDataInfo = namedtuple('MetaDataInfo', ['attr', 'attr_type', 'default'])
 
 
+class AdapterRegistry(object):
+    """
+    Process-wide registry resolving and instantiating each adapter once.
+
+    Adapters can be referenced by their dotted path or by their class, `None`
+    being the configured `METADATA_ADAPTER`. Adapter instances are shared and
+    must therefore not keep any per-request state.
+    """
+
+    def __init__(self):
+        self._classes = {}
+        self._instances = {}
+        self._data = {}
+        self._lock = RLock()
+
+    def get_class(self, adapter=None):
+        if adapter is None:
+            adapter = settings.METADATA_ADAPTER
+        if not isinstance(adapter, str):
+            return adapter
+
+        try:
+            return self._classes[adapter]
+        except KeyError:
+            with self._lock:
+                return self._classes.setdefault(adapter, import_string(adapter))
+
+    def get(self, adapter=None):
+        adapter_class = self.get_class(adapter)
+        try:
+            return self._instances[adapter_class]
+        except KeyError:
+            with self._lock:
+                if adapter_class not in self._instances:
+                    self._instances[adapter_class] = adapter_class()
+                return self._instances[adapter_class]
+
+    def get_data(self, adapter=None):
+        """
+        Returns the data precomputed by the adapter's `prepare` classmethod
+        """
+        adapter_class = self.get_class(adapter)
+        try:
+            return self._data[adapter_class]
+        except KeyError:
+            with self._lock:
+                if adapter_class not in self._data:
+                    self._data[adapter_class] = adapter_class.prepare()
+                return self._data[adapter_class]
+
+    def clear(self):
+        with self._lock:
+            self._classes.clear()
+            self._instances.clear()
+            self._data.clear()
+
+
+adapter_registry = AdapterRegistry()
+
+
+def clear_adapter_registry(**kwargs):
+    adapter_registry.clear()
+
+
+setting_changed.connect(clear_adapter_registry)
+
+
 class BaseAdapter(object):
     """
     Basic adapter that renders a dict to json with no modifications.
@@ -34,6 +110,13 @@ class BaseAdapter(object):
     def __call__(self, config):
         return self.render(config)
 
+    @classmethod
+    def prepare(cls):
+        """
+        Computes the data shared by every rendering (see `AdapterRegistry.get_data`)
+        """
+        return None
+
     @classmethod
     def adapt_field(cls, field):
         return field
@@ -58,7 +141,8 @@ class AngularFormlyAdapter(BaseAdapter):
 
     @classmethod
     def adapt_field(self, field):
-        field['validation'].update({
+        template_options = dict(field['validation'])
+        template_options.update({
             'label': field['ui']['label'],
             'type': field['type'],
         })
@@ -67,24 +151,23 @@ class AngularFormlyAdapter(BaseAdapter):
             'key': field['key'],
             'read_only': field['read_only'],
             'type': to_html_tag(field['type']),
-            'templateOptions': field['validation']
+            'templateOptions': template_options
         }
 
         if 'placeholder' in field['ui']:
-            new_field['templateOptions']['placeholder'] = field['ui']['placeholder']
+            template_options['placeholder'] = field['ui']['placeholder']
 
         if 'default' in field:
             new_field['defaultValue'] = field['default']
 
         if 'choices' in field:
-            new_field['templateOptions']['options'] = field['choices']
+            template_options['options'] = field['choices']
 
         return new_field
 
     def _render_fieldset(self, fieldset, fields_map):
         rv = []
         for field in fieldset:
-            new_field = {}
             if isinstance(field, dict):
                 computed_field = None
                 if 'key' in field and field['key'] in fields_map:
@@ -94,18 +177,18 @@ class AngularFormlyAdapter(BaseAdapter):
                 if computed_field is None:
                     continue
 
-            if computed_field is not None:
-                new_field = computed_field
+            new_field = dict(computed_field) if computed_field is not None else {}
 
             if isinstance(field, dict):
+                overrides = dict(field)
                 field_type = field.get('type', None)
                 if field_type == 'fieldset':
-                    new_field['fieldGroup'] = self._render_fieldset(field.pop('fields', []), fields_map)
-                template_options = new_field.get('templateOptions', {})
+                    new_field['fieldGroup'] = self._render_fieldset(overrides.pop('fields', []), fields_map)
+                template_options = dict(new_field.get('templateOptions', {}))
                 template_options.update(field.get('templateOptions', {}))
                 if field_type == 'fieldset' and 'label' in field:
-                    template_options['title'] = field.pop('label')
-                new_field.update(field)
+                    template_options['title'] = overrides.pop('label')
+                new_field.update(overrides)
                 new_field['templateOptions'] = template_options
                 if field_type == 'fieldset':
                     new_field.pop('type')
@@ -120,7 +203,7 @@ class AngularFormlyAdapter(BaseAdapter):
             for field in super(AngularFormlyAdapter, self).render(config)
         }
 
-        adapted = self._render_fieldset(deepcopy(config['fieldsets']), fields_map)
+        adapted = self._render_fieldset(config['fieldsets'], fields_map)
         return adapted
 
 
@@ -159,6 +242,7 @@ class EmberAdapter(BaseAdapter):
     ]
 
     def render_root(self, config):
+        config = dict(config)
         config['applications'] = [
             {
                 'name': app['name'].replace('_', '-'),
@@ -174,7 +258,7 @@ class EmberAdapter(BaseAdapter):
         new_field = {
             'label': field.get('ui', {}).get('label', ''),
             'readonly': field.get('read_only', False),
-            'extra': field.get('extra', {}),
+            'extra': dict(field.get('extra', {})),
             'name': field['key'],
             'widget': field.get('type', 'text'),
             'required': field.get('validation', {}).get('required', False),
@@ -221,27 +305,30 @@ class EmberAdapter(BaseAdapter):
         return new_field
 
     def _replace_key_with_name(self, fields):
-        for i, field in enumerate(fields):
-            new_field = field
+        rv = []
+        for field in fields:
+            new_field = dict(field)
             if 'key' in new_field:
                 new_field['name'] = new_field.pop('key')
             if 'fields' in new_field:
                 new_field['fields'] = self._replace_key_with_name(new_field['fields'])
-            fields[i] = new_field
-        return fields
+            rv.append(new_field)
+        return rv
 
     def render(self, config):
+        rv = dict(config)
+        rv['fields'] = super(EmberAdapter, self).render(config)
+        rv['fieldsets'] = [{'title': None, 'fields': self._replace_key_with_name(config['fieldsets'])}]
+
+        if 'needs' in config:
+            rv['needs'] = [
+                {
+                    key: value.replace('_', '-')
+                    for key, value in need.items()
+                } for need in config['needs']
+            ]
 
-        config['fields'] = super(EmberAdapter, self).render(config)
-        config['fieldsets'] = [{'title': None, 'fields': self._replace_key_with_name(config['fieldsets'])}]
-
-        for i, need in enumerate(config.get('needs', [])):
-            config['needs'][i] = {
-                key: value.replace('_', '-')
-                for key, value in need.items()
-            }
-
-        return config
+        return rv
 
     @classmethod
     def adapt_wizard(cls, func):
@@ -276,16 +363,36 @@ class ReactJsonSchemaAdapter(BaseAdapter):
     _schema_type_default = 'string'
     _ui_type_default = None
 
+    # hoist enums used by several fields into `$defs`
+    use_definitions = False
+    definition_keys = ('enum', 'enumNames')
+
+    def __init_subclass__(cls, **kwargs):
+        super(ReactJsonSchemaAdapter, cls).__init_subclass__(**kwargs)
+        cls.init_type_dicts()
+
+    @classmethod
+    def init_type_dicts(cls):
+        cls._schema_types = cls.create_type_dict_for('schema')
+        cls._ui_types = cls.create_type_dict_for('ui')
+
     @classmethod
     def create_type_dict_for(cls, dict_type):
         rv = defaultdict(lambda: getattr(cls, '_{}_type_default'.format(dict_type)))
         rv.update(getattr(cls, '_{}_type_mapping'.format(dict_type)))
         return rv
 
+    @classmethod
+    def prepare(cls):
+        return {
+            'schema': cls._schema_types,
+            'ui': cls._ui_types,
+        }
+
     @classmethod
     def adapt_field(cls, field):
-        schema_type_mapping = cls.create_type_dict_for('schema')
-        ui_type_mapping = cls.create_type_dict_for('ui')
+        schema_type_mapping = cls._schema_types
+        ui_type_mapping = cls._ui_types
 
         new_field = {
             'required': field['validation'].get('required', False),
@@ -320,88 +427,172 @@ class ReactJsonSchemaAdapter(BaseAdapter):
         return new_field
 
     def deep_update(self, orig, updater):
+        """
+        Returns a copy of `orig` recursively updated with `updater`
+        """
+        rv = dict(orig)
         for k, v in updater.items():
             if isinstance(v, Mapping):
-                rv = self.deep_update(orig.get(k, {}), v)
-                orig[k] = rv
+                rv[k] = self.deep_update(orig.get(k, {}), v)
             else:
-                orig[k] = updater[k]
-        return orig
+                rv[k] = updater[k]
+        return rv
+
+    def get_key_index(self, fields):
+        index = {}
+        for field in fields:
+            if 'key' in field:
+                index.setdefault(field['key'], field)
+        return index
 
-    def update_field_by_key(self, fields, original):
-        rv = None
+    def update_field_by_key(self, fields, original, index=None):
         key = original.get('key', None)
         if key is None:
             return original
 
-        for field in fields:
-            if 'key' in field and field['key'] == key:
-                rv = field
-                break
+        if index is None:
+            index = self.get_key_index(fields)
 
+        rv = index.get(key, None)
         if rv is not None:
-            rv = self.deep_update(rv, original)
-            return rv
+            return self.deep_update(rv, original)
 
         return original
 
-    def map_fieldset_schema(self, fieldset, fields, title=None):
+    def map_fieldset(self, fieldset, index, title=None):
+        """
+        Returns the schema and the ui of `fieldset` in a single pass
+        """
         schema = {
             'type': 'object',
             'properties': {}
         }
+        ui = {}
 
         if title is not None:
             schema['title'] = title
 
         required = []
+        order = []
 
         if 'title' in fieldset and fieldset['title'] is not None:
             schema['title'] = fieldset['title']
 
         for field in fieldset.get('fields', []):
-            field = self.update_field_by_key(fields, field)
+            field = self.update_field_by_key(None, field, index)
+            key = field['key']
 
             if field['required']:
-                required.append(field['key'])
+                required.append(key)
+            order.append(key)
 
             if field['schema']['type'] == 'object':
-                schema['properties'][field['key']] = self.map_fieldset_schema(field)
+                schema['properties'][key], sub_ui = self.map_fieldset(field, index)
+                ui[key] = dict(field['ui'])
+                ui[key].update(sub_ui)
             else:
-                schema['properties'][field['key']] = field['schema']
+                schema['properties'][key] = field['schema']
+                ui[key] = field['ui']
 
         schema['required'] = required
-        return schema
-
-    def map_fieldset_ui(self, fieldset, fields):
-        ui = {}
-        order = []
-
-        for field in fieldset.get('fields', []):
-            field = self.update_field_by_key(fields, field)
-            order.append(field['key'])
-            ui[field['key']] = field['ui']
+        ui['ui:order'] = order
+        return schema, ui
 
-            if field['schema']['type'] == 'object':
-                ui[field['key']].update(self.map_fieldset_ui(field))
+    def map_fieldset_schema(self, fieldset, fields, title=None):
+        return self.map_fieldset(fieldset, self.get_key_index(fields), title)[0]
 
-        ui['ui:order'] = order
-        return ui
+    def map_fieldset_ui(self, fieldset, fields):
+        return self.map_fieldset(fieldset, self.get_key_index(fields))[1]
 
     def render(self, config):
-
+        fieldsets = config['fieldsets']
+        config = {key: value for key, value in config.items() if key != 'fieldsets'}
         config['fields'] = super(ReactJsonSchemaAdapter, self).render(config)
-        fieldsets = config.pop('fieldsets')
+        index = self.get_key_index(config['fields'])
 
         try:
-            schema = self.map_fieldset_schema({'fields': fieldsets}, config['fields'], fieldsets[0].get('title', None))
-            ui = self.map_fieldset_ui({'fields': fieldsets}, config['fields'])
+            schema, ui = self.map_fieldset({'fields': fieldsets}, index, fieldsets[0].get('title', None))
         except KeyError:
             # We are dealing with a Serializer, not an Endpoint
-            schema = self.map_fieldset_schema(fieldsets[0], config['fields'], fieldsets[0].get('title', None))
-            ui = self.map_fieldset_ui(fieldsets[0], config['fields'])
+            schema, ui = self.map_fieldset(fieldsets[0], index, fieldsets[0].get('title', None))
+
+        if self.use_definitions:
+            schema = self.hoist_definitions(schema)
 
         config['schema'] = schema
         config['ui'] = ui
 
         return config
+
+    def get_definition(self, property_schema):
+        if 'enum' not in property_schema:
+            return None
+        return {key: property_schema[key] for key in self.definition_keys if key in property_schema}
+
+    def get_definition_name(self, definition):
+        content = json.dumps(definition, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+        return 'enum_{}'.format(hashlib.md5(content.encode('utf-8')).hexdigest()[:12])
+
+    def _iter_properties(self, schema):
+        for property_schema in schema.get('properties', {}).values():
+            if property_schema.get('type', None) == 'object' and 'properties' in property_schema:
+                for item in self._iter_properties(property_schema):
+                    yield item
+            else:
+                yield property_schema
+
+    def _replace_definitions(self, schema, names):
+        rv = dict(schema)
+        rv['properties'] = {}
+        for key, property_schema in schema.get('properties', {}).items():
+            if property_schema.get('type', None) == 'object' and 'properties' in property_schema:
+                rv['properties'][key] = self._replace_definitions(property_schema, names)
+                continue
+
+            definition = self.get_definition(property_schema)
+            name = names.get(id(property_schema), None)
+            if definition is None or name is None:
+                rv['properties'][key] = property_schema
+                continue
+
+            new_schema = {
+                k: v
+                for k, v in property_schema.items()
+                if k not in definition
+            }
+            new_schema['$ref'] = '#/$defs/{}'.format(name)
+            rv['properties'][key] = new_schema
+        return rv
+
+    def hoist_definitions(self, schema):
+        """
+        Returns a copy of `schema` where definitions (enums) shared by several properties
+        are moved to `$defs` and referenced with `$ref`.
+        """
+        definitions = {}
+        usages = {}
+        for property_schema in self._iter_properties(schema):
+            definition = self.get_definition(property_schema)
+            if definition is None:
+                continue
+            name = self.get_definition_name(definition)
+            definitions[name] = definition
+            usages.setdefault(name, []).append(id(property_schema))
+
+        names = {
+            schema_id: name
+            for name, schema_ids in usages.items() if len(schema_ids) > 1
+            for schema_id in schema_ids
+        }
+        if len(names) == 0:
+            return schema
+
+        rv = self._replace_definitions(schema, names)
+        rv['$defs'] = {
+            name: definitions[name]
+            for name in sorted(set(names.values()))
+        }
+        return rv
+
+
+ReactJsonSchemaAdapter.init_type_dicts()
@@ -1,6 +1,7 @@
 from collections import defaultdict
 
 from django.conf import settings as django_settings
+from django.test.signals import setting_changed
 
 
 DEFAULT_SETTINGS = {
@@ -41,17 +42,26 @@ DEFAULT_SETTINGS = {
     'ACTION_BTN_CLASS': 'btn btn-default',
     'ROUTER_CLASS': 'drf_auto_endpoint.router.EndpointRouter',
     'DEFAULT_ENDPOINT_MODULES': 'endpoints',
+    'METADATA_CACHE_SIZE': 0,
+    'BULK_METADATA_WORKERS': 1,
+    'PRESERIALIZE_METADATA': False,
+    'LAZY_ENDPOINTS': False,
+    'PROFILE_REGISTRATION': False,
 }
 
 
 class Settings(object):
 
     def __init__(self):
-        mapping = DEFAULT_SETTINGS['WIDGET_MAPPING']
+        self.load_widget_mapping()
+
+    def load_widget_mapping(self):
+        mapping = dict(DEFAULT_SETTINGS['WIDGET_MAPPING'])
         mapping.update(getattr(django_settings, 'DRF_AUTO_WIDGET_MAPPING', {}))
-        self.WIDGET_MAPPING = defaultdict(lambda: self.DEFAULT_WIDGET)
+        widget_mapping = defaultdict(lambda: self.DEFAULT_WIDGET)
         for k, v in mapping.items():
-            self.WIDGET_MAPPING[k] = v
+            widget_mapping[k] = v
+        self.WIDGET_MAPPING = widget_mapping
 
     def __getattr__(self, name):
         if name not in DEFAULT_SETTINGS:
@@ -60,3 +70,11 @@ class Settings(object):
 
 
 settings = Settings()
+
+
+def reload_widget_mapping(setting, **kwargs):
+    if setting == 'DRF_AUTO_WIDGET_MAPPING':
+        settings.load_widget_mapping()
+
+
+setting_changed.connect(reload_widget_mapping)
@@ -16,3 +16,6 @@ class DRFAutoEndpointConfig(AppConfig):
             pass
 
         autodiscover_modules('endpoints', register_to=router)
+
+        if hasattr(router, 'get_root_metadata'):
+            router.get_root_metadata()
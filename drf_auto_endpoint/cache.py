@@ -0,0 +1,87 @@
+from collections import OrderedDict, namedtuple
+from threading import RLock
+
+from django.test.signals import setting_changed
+
+from .app_settings import settings
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class MetadataCache(object):
+    """
+    Bounded LRU cache for adapted endpoint metadata.
+
+    Keys are tuples whose first item is the endpoint url, which allows
+    invalidating every entry related to a single endpoint at once.
+    """
+
+    def __init__(self, maxsize=None):
+        self._maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is not None:
+            return self._maxsize
+        return settings.METADATA_CACHE_SIZE
+
+    @property
+    def enabled(self):
+        return bool(self.maxsize)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        maxsize = self.maxsize
+        if not maxsize:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, url=None):
+        with self._lock:
+            if url is None:
+                self._data.clear()
+                return
+            for key in [key for key in self._data.keys() if key[0] == url]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+
+metadata_cache = MetadataCache()
+
+
+def invalidate_metadata_cache(url=None, **kwargs):
+    metadata_cache.invalidate(url)
+
+
+setting_changed.connect(invalidate_metadata_cache)
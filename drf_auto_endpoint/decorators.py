@@ -1,12 +1,15 @@
-from django.utils.module_loading import import_string
+from functools import update_wrapper
+from threading import RLock
+from weakref import WeakKeyDictionary
 
-from inflector import Inflector
+from django.test.signals import setting_changed
 
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.serializers import PrimaryKeyRelatedField
 
-from .app_settings import settings
+from .inflectors import get_inflector
+from .profiling import registration_profiler
 from .utils import action_kwargs, get_field_dict, get_languages
 
 
@@ -54,8 +57,7 @@ def wizard(target_model, serializer=None, icon_class=None, btn_class=None, text=
     assert serializer is not None, "You need to pass a serializer to the wizard decorator"
     assert meta_type in ['custom', 'list']
 
-    inflector_language = import_string(settings.INFLECTOR_LANGUAGE)
-    inflector = Inflector(inflector_language)
+    inflector = get_inflector()
 
     _kwargs = {
         'type': 'wizard',
@@ -66,23 +68,6 @@ def wizard(target_model, serializer=None, icon_class=None, btn_class=None, text=
 
     kwargs['params']['fieldsets'] = kwargs.pop('fieldsets', None)
 
-    serializer_instance = serializer()
-    needs = []
-    fields = []
-    Adapter = import_string(settings.METADATA_ADAPTER)
-    for field_name, field in serializer_instance.fields.items():
-        if isinstance(field, PrimaryKeyRelatedField):
-            model = field.queryset.model
-            needs.append({
-                'app': model._meta.app_label,
-                'singular': model._meta.model_name.lower(),
-                'plural': inflector.pluralize(model._meta.model_name.lower()),
-            })
-        fields.append(Adapter.adapt_field(get_field_dict(field_name, serializer_instance)))
-    kwargs['params']['needs'] = needs
-    kwargs['params']['fields'] = fields
-    kwargs['languages'] = get_languages()
-
     def decorator(func):
 
         def wizard_func(self, request, *args, **kwargs):
@@ -116,7 +101,59 @@ def wizard(target_model, serializer=None, icon_class=None, btn_class=None, text=
                 wizard_func.__name__
             )
         wizard_func.serializer = serializer
+        wizard_func.profile_label = '{}.{}'.format(func.__module__, func.__qualname__.rsplit('.', 1)[0])
 
-        return Adapter.adapt_wizard(wizard_func)
+        return wizard_func
 
     return decorator
+
+
+_wizard_action_kwargs = WeakKeyDictionary()
+_wizard_lock = RLock()
+
+
+def get_wizard_action_kwargs(func, adapter_class):
+    """
+    Returns the `action_kwargs` of the wizard `func` adapted for `adapter_class`.
+    The fields and needs of the wizard are computed on first use and cached per adapter.
+    """
+    func = getattr(func, '__func__', func)
+    adapted = _wizard_action_kwargs.get(func, {})
+    if adapter_class in adapted:
+        return adapted[adapter_class]
+
+    with registration_profiler.measure(getattr(func, 'profile_label', func.__qualname__), 'wizard'):
+        inflector = get_inflector()
+        serializer_instance = func.serializer()
+        needs = []
+        fields = []
+        for field_name, field in serializer_instance.fields.items():
+            if isinstance(field, PrimaryKeyRelatedField):
+                model = field.queryset.model
+                needs.append({
+                    'app': model._meta.app_label,
+                    'singular': model._meta.model_name.lower(),
+                    'plural': inflector.pluralize(model._meta.model_name.lower()),
+                })
+            fields.append(adapter_class.adapt_field(get_field_dict(field_name, serializer_instance)))
+
+        # adapters expect a function whose action_kwargs they can update
+        wizard_func = update_wrapper(lambda *args, **kwargs: func(*args, **kwargs), func)
+        wizard_func.action_kwargs = dict(func.action_kwargs)
+        wizard_func.action_kwargs['params'] = dict(func.action_kwargs['params'])
+        wizard_func.action_kwargs['params']['needs'] = needs
+        wizard_func.action_kwargs['params']['fields'] = fields
+        wizard_func.action_kwargs['languages'] = get_languages()
+        rv = adapter_class.adapt_wizard(wizard_func).action_kwargs
+
+    with _wizard_lock:
+        _wizard_action_kwargs.setdefault(func, {})[adapter_class] = rv
+    return rv
+
+
+def clear_wizard_action_kwargs(**kwargs):
+    with _wizard_lock:
+        _wizard_action_kwargs.clear()
+
+
+setting_changed.connect(clear_wizard_action_kwargs)
@@ -2,18 +2,23 @@ try:
     from collections import Iterable
 except ImportError:
     from collections.abc import Iterable
-import json
-import os
+from contextlib import contextmanager
+from threading import local, RLock
 
 from django.db.models.fields.related import ForeignKey
 from django.conf import settings as django_settings
-from django.urls import reverse
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import get_script_prefix, get_urlconf, reverse
+from django.utils.translation import get_language
 from django.utils.module_loading import import_string
 
-from inflector import Inflector
-
-from .factories import serializer_factory, viewset_factory
-from .utils import get_languages, get_field_dict
+from .adapters import adapter_registry
+from .decorators import get_wizard_action_kwargs
+from .factories import list_serializer_factory, serializer_factory, viewset_factory
+from .fieldsets import fieldsets_store, get_fieldsets_path
+from .inflectors import get_inflector
+from .profiling import get_profile_label, registration_profiler
+from .utils import get_languages, get_field_dict, get_viewset_actions
 from .app_settings import settings
 
 try:
@@ -27,6 +32,25 @@ except ImportError:
     translator = Translator()
 
 
+_metadata_contexts = local()
+_factory_lock = RLock()
+
+
+class MetadataContext(object):
+    """
+    Request-scoped memo of what the metadata getters of an endpoint share
+    """
+
+    __slots__ = ('request', 'adapter', 'serializer_instance', 'field_names', 'field_dicts')
+
+    def __init__(self, request, adapter=None):
+        self.request = request
+        self.adapter = adapter
+        self.serializer_instance = None
+        self.field_names = None
+        self.field_dicts = {}
+
+
 def get_all_field_names(model):
     return [
         field.name
@@ -39,88 +63,59 @@ class EndpointMetaClass(type):
 
     def __new__(cls, name, bases, attrs):
         new_class = super(EndpointMetaClass, cls).__new__(cls, name, bases, attrs)
-        inflector = None
-
-        processed = []
-
-        black_list = dir(BaseEndpoint)
-        model = getattr(new_class, 'model', None)
-
-        for base in reversed(new_class.__mro__):
-            for key, value in list(base.__dict__.items()):
-                if key not in black_list and key not in processed and hasattr(value, 'wizard') and value.wizard:
-                    if getattr(value, 'action_kwargs', {}).get('params', {}).get('model', None) is None:
-
-                        if model is not None:
-                            if inflector is None:
-                                inflector_language = import_string(settings.INFLECTOR_LANGUAGE)
-                                inflector = Inflector(inflector_language)
-
-                            getattr(new_class, key).action_kwargs['params']['model'] = '{}/{}/{}'.format(
-                                model._meta.app_label.lower().replace('_', '-'),
-                                inflector.pluralize(model._meta.model_name.lower()),
-                                value.__name__
-                            )
-
-                            processed.append(key)
-
-                    if getattr(value, 'action_kwargs', {}).get('params', {}).get('fieldsets', None) is None \
-                            and getattr(new_class, 'model', None) is not None and hasattr(value, 'serializer'):
-
-                        fieldsets_path = os.path.join(
-                            django_settings.BASE_DIR,
-                            new_class._fieldsets_location,
-                            new_class.__module__.rsplit('.', 1)[0],
-                            'fieldsets.json'
-                        )
-
-                        try:
-                            with open(fieldsets_path, 'r') as f:
-                                fieldsets = json.load(f)
-                                value.action_kwargs['params']['fieldsets'] = \
-                                    fieldsets['{}_{}'.format(new_class.model.__name__, key)]
-                        except FileNotFoundError:
-                            pass
-                        except KeyError:
-                            pass
-
-                        if getattr(value, 'action_kwargs', {}).get('params', {}).get('fieldsets', None) is None:
-                            value.action_kwargs = getattr(value, 'action_kwargs', {})
-                            value.action_kwargs['params'] = value.action_kwargs.get('params', {})
-                            value.action_kwargs['params']['fieldsets'] = [
-                                {'name': field}
-                                for field in value.serializer().fields.keys()
-                            ]
-
-        if getattr(new_class, 'fieldset_name', None) is not None:
-            fieldsets_path = os.path.join(
-                django_settings.BASE_DIR,
-                new_class.__module__.rsplit('.', 1)[0],
-                'fieldsets.json'
-            )
-            try:
-                with open(fieldsets_path, 'r') as f:
-                    fieldsets = json.load(f)
-                    new_class.fieldsets = fieldsets[new_class.fieldset_name]
-            except FileNotFoundError:
-                pass
-            except KeyError:
-                pass
-
-        if new_class.fieldsets is None and new_class.model is not None:
-            fieldsets_path = os.path.join(
-                django_settings.BASE_DIR,
-                new_class.__module__.rsplit('.', 1)[0],
-                'fieldsets.json'
-            )
-            try:
-                with open(fieldsets_path, 'r') as f:
-                    fieldsets = json.load(f)
-                    new_class.fieldsets = fieldsets[new_class.model.__name__]
-            except FileNotFoundError:
-                pass
-            except KeyError:
-                pass
+        label = get_profile_label(new_class)
+
+        with registration_profiler.measure(label, 'metaclass'):
+            processed = []
+
+            black_list = dir(BaseEndpoint)
+            model = getattr(new_class, 'model', None)
+
+            for base in reversed(new_class.__mro__):
+                for key, value in list(base.__dict__.items()):
+                    if key not in black_list and key not in processed and hasattr(value, 'wizard') and value.wizard:
+                        if getattr(value, 'action_kwargs', {}).get('params', {}).get('model', None) is None:
+
+                            if model is not None:
+                                getattr(new_class, key).action_kwargs['params']['model'] = '{}/{}/{}'.format(
+                                    model._meta.app_label.lower().replace('_', '-'),
+                                    get_inflector().pluralize(model._meta.model_name.lower()),
+                                    value.__name__
+                                )
+
+                                processed.append(key)
+
+                        if getattr(value, 'action_kwargs', {}).get('params', {}).get('fieldsets', None) is None \
+                                and getattr(new_class, 'model', None) is not None and hasattr(value, 'serializer'):
+
+                            with registration_profiler.measure(label, 'fieldsets'):
+                                fieldsets = fieldsets_store.get(
+                                    get_fieldsets_path(new_class),
+                                    '{}_{}'.format(new_class.model.__name__, key)
+                                )
+                            if fieldsets is not None:
+                                value.action_kwargs['params']['fieldsets'] = fieldsets
+
+                            if getattr(value, 'action_kwargs', {}).get('params', {}).get('fieldsets', None) is None:
+                                value.action_kwargs = getattr(value, 'action_kwargs', {})
+                                value.action_kwargs['params'] = value.action_kwargs.get('params', {})
+                                value.action_kwargs['params']['fieldsets'] = [
+                                    {'name': field}
+                                    for field in value.serializer().fields.keys()
+                                ]
+
+            if getattr(new_class, 'fieldset_name', None) is not None:
+                with registration_profiler.measure(label, 'fieldsets'):
+                    fieldsets = fieldsets_store.get(get_fieldsets_path(new_class), new_class.fieldset_name,
+                                                    required=True)
+                if fieldsets is not None:
+                    new_class.fieldsets = fieldsets
+
+            if new_class.fieldsets is None and new_class.model is not None:
+                with registration_profiler.measure(label, 'fieldsets'):
+                    fieldsets = fieldsets_store.get(get_fieldsets_path(new_class), new_class.model.__name__)
+                if fieldsets is not None:
+                    new_class.fieldsets = fieldsets
 
         return new_class
 
@@ -138,6 +133,7 @@ class BaseEndpoint(object):
     foreign_key_as_list = False
 
     serializer = None
+    list_serializer = None
     fieldsets = None
 
     list_display = None
@@ -154,6 +150,14 @@ class BaseEndpoint(object):
     read_only = False
     include_str = True
     list_me = True
+    optimize_queryset = True
+    select_related = None
+    prefetch_related = None
+    only_fields = None
+    sparse_fieldsets = False
+    read_from_values = False
+    metadata_adapter = None
+    metadata_vary_on = None
 
     save_twice = False
     sortable_by = None
@@ -168,6 +172,7 @@ class BaseEndpoint(object):
     _translated_field_names = None
     _default_language_field_names = None
     _fieldsets_location = ''
+    _action_table = None
 
     def get_languages(self, request=None):
         return get_languages()
@@ -219,22 +224,78 @@ class BaseEndpoint(object):
     def get_serializer(self, data=None):
 
         if self.serializer is None:
-            if self.viewset is None:
-                self.serializer = serializer_factory(self)
-            elif isinstance(self.viewset, type):
-                viewset = self.viewset()
-                self.serializer = viewset.get_serializer_class()
-            else:
-                self.serializer = self.viewset.get_serializer_class()
+            with _factory_lock:
+                if self.serializer is None:
+                    if self.viewset is None:
+                        with registration_profiler.measure(get_profile_label(self), 'serializer_factory'):
+                            self.serializer = serializer_factory(self)
+                    elif isinstance(self.viewset, type):
+                        viewset = self.viewset()
+                        self.serializer = viewset.get_serializer_class()
+                    else:
+                        self.serializer = self.viewset.get_serializer_class()
 
         if data is None:
             return self.serializer
 
         return self.serializer(data)
 
+    def get_list_serializer(self):
+        """
+        Returns the serializer used by the `list` action of the generated viewset (`None` to use the serializer)
+        """
+        if self.list_serializer is True:
+            with _factory_lock:
+                if self.list_serializer is True:
+                    with registration_profiler.measure(get_profile_label(self), 'serializer_factory'):
+                        self.list_serializer = list_serializer_factory(self)
+
+        return self.list_serializer or None
+
     def get_serializer_instance(self, request=None):
         return self.get_serializer()()
 
+    def get_metadata_vary_key(self, request):
+        """
+        Returns a hashable key identifying the variant of this endpoint's metadata for `request`,
+        built from `metadata_vary_on` (None when the metadata doesn't depend on the request).
+        """
+        if self.metadata_vary_on is None:
+            return None
+
+        rv = []
+        for item in self.metadata_vary_on:
+            if item == 'user':
+                user = getattr(request, 'user', None)
+                rv.append(None if user is None or not user.is_authenticated else user.pk)
+            elif item == 'groups':
+                user = getattr(request, 'user', None)
+                rv.append(tuple(sorted(user.groups.values_list('pk', flat=True)))
+                          if user is not None and user.is_authenticated else ())
+            elif item == 'language':
+                rv.append(get_language())
+            elif item.startswith('header:'):
+                rv.append(request.headers.get(item[7:]))
+            elif item.startswith('meta:'):
+                rv.append(request.META.get(item[5:]))
+            else:
+                raise ImproperlyConfigured('Unknown metadata_vary_on item "{}" on {}'.format(
+                    item, self.__class__.__name__
+                ))
+        return tuple(rv)
+
+    def get_metadata_vary_headers(self):
+        """
+        Returns the request headers this endpoint's metadata varies on (used for the Vary header)
+        """
+        rv = []
+        for item in self.metadata_vary_on or ():
+            if item == 'language':
+                rv.append('Accept-Language')
+            elif item.startswith('header:'):
+                rv.append(item[7:])
+        return rv
+
     def get_base_viewset(self):
         if not self.read_only:
             return self.base_viewset
@@ -248,7 +309,10 @@ class BaseEndpoint(object):
     def get_viewset(self):
 
         if self.viewset is None:
-            self.viewset = viewset_factory(self)
+            with _factory_lock:
+                if self.viewset is None:
+                    with registration_profiler.measure(get_profile_label(self), 'viewset_factory'):
+                        self.viewset = viewset_factory(self)
 
         return self.viewset
 
@@ -262,7 +326,65 @@ class BaseEndpoint(object):
             self.model_name.replace('_', '-')
         )
 
-    def _get_field_dict(self, field, serializer_instance=None):
+    @contextmanager
+    def metadata_context(self, request=None, adapter=None):
+        """
+        Within this context, the serializer instance, field names and field dicts of this endpoint
+        are only computed once (for `request`) and shared by the metadata getters.
+        `adapter` is the metadata adapter the getters are collecting metadata for.
+        """
+        contexts = getattr(_metadata_contexts, 'contexts', None)
+        if contexts is None:
+            contexts = _metadata_contexts.contexts = {}
+
+        previous = contexts.get(self, None)
+        if previous is not None and previous.request is request and adapter in (None, previous.adapter):
+            yield previous
+            return
+
+        contexts[self] = MetadataContext(request, adapter)
+        try:
+            yield contexts[self]
+        finally:
+            if previous is None:
+                del contexts[self]
+            else:
+                contexts[self] = previous
+
+    def _get_metadata_context(self, request=None):
+        context = getattr(_metadata_contexts, 'contexts', {}).get(self, None)
+        if context is not None and context.request is request:
+            return context
+        return None
+
+    def get_metadata_adapter_class(self, request=None):
+        """
+        Returns the class of the adapter metadata is being collected for
+        (or the adapter used by this endpoint outside of a metadata context)
+        """
+        context = self._get_metadata_context(request)
+        if context is not None and context.adapter is not None:
+            return context.adapter.__class__
+        return adapter_registry.get_class(getattr(self, 'metadata_adapter', None))
+
+    def _get_serializer_instance(self, request=None):
+        context = self._get_metadata_context(request)
+        if context is None:
+            return self.get_serializer_instance(request)
+        if context.serializer_instance is None:
+            context.serializer_instance = self.get_serializer_instance(request)
+        return context.serializer_instance
+
+    def _get_field_dict(self, field, serializer_instance=None, request=None):
+        context = self._get_metadata_context(request)
+        if context is not None and (serializer_instance is None or serializer_instance is context.serializer_instance):
+            if field not in context.field_dicts:
+                context.field_dicts[field] = self._build_field_dict(field, self._get_serializer_instance(request))
+            return context.field_dicts[field]
+
+        return self._build_field_dict(field, serializer_instance)
+
+    def _build_field_dict(self, field, serializer_instance=None):
         foreign_key_as_list = (isinstance(self.foreign_key_as_list, Iterable) and field in self.foreign_key_as_list) \
             or (not isinstance(self.foreign_key_as_list, Iterable) and self.foreign_key_as_list)
 
@@ -273,55 +395,51 @@ class BaseEndpoint(object):
                               self.fields_annotation, self.model, foreign_key_as_list=foreign_key_as_list)
 
     def get_field_names(self, request=None):
-        return self.get_serializer_instance(request).fields.keys()
+        context = self._get_metadata_context(request)
+        if context is None:
+            return self._get_serializer_instance(request).fields.keys()
+        if context.field_names is None:
+            context.field_names = self._get_serializer_instance(request).fields.keys()
+        return context.field_names
 
     def get_fields(self, request=None):
-        serializer_instance = self.get_serializer_instance(request)
+        serializer_instance = self._get_serializer_instance(request)
         return [
-            self._get_field_dict(field, serializer_instance)
+            self._get_field_dict(field, serializer_instance, request)
             for field in self.get_field_names(request)
         ]
 
     def get_fieldsets(self, request=None):
 
         if django_settings.DEBUG:
-            fieldsets_path = os.path.join(
-                django_settings.BASE_DIR,
-                self._fieldsets_location,
-                self.__module__.rsplit('.', 1)[0],
-                'fieldsets.json'
-            )
+            if hasattr(self, 'fieldset_name'):
+                key = self.fieldset_name
+            else:
+                key = getattr(self.model, '__name__', None)
 
-            try:
-                with open(fieldsets_path, 'r') as f:
-                    fieldsets = json.load(f)
-                    if hasattr(self, 'fieldset_name'):
-                        self.fieldsets = fieldsets[self.fieldset_name]
-                    else:
-                        self.fieldsets = fieldsets[self.model.__name__]
-            except FileNotFoundError:
-                pass
-            except KeyError:
-                pass
+            fieldsets = fieldsets_store.get(get_fieldsets_path(self), key)
+            if fieldsets is not None:
+                self.fieldsets = fieldsets
 
         if self.fieldsets is not None:
             return [{'key': field} if not isinstance(field, dict)
                     else field
                     for field in self.fieldsets]
 
-        serializer_instance = self.get_serializer_instance(request)
+        serializer_instance = self._get_serializer_instance(request)
 
         return [{'key': field}
                 for field in self.get_field_names(request)
                 if field != 'id' and field != '__str__' and
                 field not in self.translated_field_names and
-                self._get_field_dict(field, serializer_instance).get('type', '')[:6] != 'tomany']
+                self._get_field_dict(field, serializer_instance, request).get('type', '')[:6] != 'tomany']
 
     def get_list_display(self, request=None):
         if self.list_display is None:
-            if '__str__' in self.get_field_names(request):
+            field_names = self.get_field_names(request)
+            if '__str__' in field_names:
                 return ['__str__', ]
-            return [self.get_fields()[0]['key']]
+            return [next(iter(field_names))]
         elif self.list_display == '__all__':
             return self.get_field_names(request)
         return self.list_display
@@ -353,10 +471,11 @@ class BaseEndpoint(object):
         return fields
 
     def get_needs(self, request=None):
+        field_names = set(self.get_field_names(request))
         model_fields = [
             f
             for f in self.model._meta.get_fields()
-            if f.is_relation and f.name in self.get_field_names(request) and (
+            if f.is_relation and f.name in field_names and (
                 not isinstance(f, ForeignKey) or
                 self.foreign_key_as_list is False or (
                    isinstance(self.foreign_key_as_list, Iterable) and
@@ -427,84 +546,72 @@ class BaseEndpoint(object):
             verb = list(action.mapping.keys())[0]
         return verb
 
-    def get_custom_actions(self, request=None):
-        rv = []
-        viewset = self.get_viewset()
+    def _get_action_table(self, action_type):
+        """
+        Returns (url, verb, action) for each action of `action_type`,
+        reversed once per script prefix, urlconf and language (urls may be translated).
+        """
+        key = (action_type, get_script_prefix(), get_urlconf() or django_settings.ROOT_URLCONF, get_language())
+        if self._action_table is None:
+            self._action_table = {}
+        elif key in self._action_table:
+            return self._action_table[key]
 
-        for action_name in dir(viewset):
-            try:
-                action = getattr(viewset, action_name)
-            except AttributeError:
-                continue
-            if getattr(action, 'action_type', None) == 'custom':
-                custom_action = {
-                    'url': reverse('{}-{}'.format(self.get_url(), action.__name__.lower().replace('_', '-')),
-                                   kwargs={getattr(viewset, 'lookup_field', 'pk'): ':id'}),
-                    'verb': self._verb_for_action(action),
-                }
-                custom_action.update(action.action_kwargs)
-                rv.append(custom_action)
-
-        if self.custom_actions is not None:
-            rv += self.custom_actions
+        viewset = self.get_viewset()
+        table = []
+        for action in get_viewset_actions(viewset)[action_type]:
+            if action_type == 'custom':
+                url = reverse('{}-{}'.format(self.get_url(), action.__name__.lower().replace('_', '-')),
+                              kwargs={getattr(viewset, 'lookup_field', 'pk'): ':id'})
+            else:
+                url = reverse('{}-{}'.format(self.get_url(), action.__name__.lower()))
+            table.append((url, self._verb_for_action(action), action))
 
-        return rv
+        self._action_table[key] = table
+        return table
 
-    def get_bulk_actions(self, request=None):
+    def _get_actions(self, action_type, extra_actions, request=None):
         rv = []
-        viewset = self.get_viewset()
+        adapter_class = None
+        for url, verb, action in self._get_action_table(action_type):
+            if getattr(action, 'wizard', False):
+                if adapter_class is None:
+                    adapter_class = self.get_metadata_adapter_class(request)
+                action_kwargs = get_wizard_action_kwargs(action, adapter_class)
+            else:
+                action_kwargs = action.action_kwargs
+            action = {
+                'url': url,
+                'verb': verb,
+            }
+            action.update(action_kwargs)
+            rv.append(action)
 
-        for action_name in dir(viewset):
-            try:
-                action = getattr(viewset, action_name)
-            except AttributeError:
-                continue
-            if getattr(action, 'action_type', None) == 'bulk':
-                bulk_action = {
-                    'url': reverse('{}-{}'.format(self.get_url(), action.__name__.lower())),
-                    'verb': self._verb_for_action(action),
-                }
-                bulk_action.update(action.action_kwargs)
-                rv.append(bulk_action)
-
-        if self.bulk_actions is not None:
-            rv += self.bulk_actions
+        if extra_actions is not None:
+            rv += extra_actions
 
         return rv
 
-    def get_list_actions(self, request=None):
-        rv = []
-        viewset = self.get_viewset()
+    def get_custom_actions(self, request=None):
+        return self._get_actions('custom', self.custom_actions, request)
 
-        for action_name in dir(viewset):
-            try:
-                action = getattr(viewset, action_name)
-            except AttributeError:
-                continue
-            if getattr(action, 'action_type', None) == 'list':
-                list_action = {
-                    'url': reverse('{}-{}'.format(self.get_url(), action.__name__.lower())),
-                    'verb': self._verb_for_action(action),
-                }
-                list_action.update(action.action_kwargs)
-                rv.append(list_action)
-
-        if self.list_actions is not None:
-            rv += self.list_actions
+    def get_bulk_actions(self, request=None):
+        return self._get_actions('bulk', self.bulk_actions, request)
 
-        return rv
+    def get_list_actions(self, request=None):
+        return self._get_actions('list', self.list_actions, request)
 
 
 class Endpoint(BaseEndpoint, metaclass=EndpointMetaClass):
 
     def __init__(self, model=None, **kwargs):
-        self.inflector = Inflector(self.inflector_language)
+        self.inflector = get_inflector(self.inflector_language)
 
         if model is not None:
             self.model = model
 
-        arg_names = ('fields', 'serializer', 'permission_classes', 'filter_fields', 'search_fields',
-                     'viewset', 'read_only', 'include_str', 'ordering_fields', 'page_size',
+        arg_names = ('fields', 'serializer', 'list_serializer', 'permission_classes', 'filter_fields',
+                     'search_fields', 'viewset', 'read_only', 'include_str', 'ordering_fields', 'page_size',
                      'base_viewset', 'fields_annotation', 'fieldsets', 'base_serializer', 'list_me')
         for arg_name in arg_names:
             setattr(self, arg_name, kwargs.pop(arg_name, getattr(self, arg_name, None)))
@@ -520,14 +627,15 @@ class Endpoint(BaseEndpoint, metaclass=EndpointMetaClass):
         else:
             assert self.viewset is not None or self.model is not None, \
                 'You need to specify at least a model or a viewset'
-            self.get_serializer()
+            if not settings.LAZY_ENDPOINTS:
+                self.get_serializer()
 
         if self.viewset is not None:
             for attr in ('permission_classes', 'filter_fields', 'search_fields', 'ordering_fields',
                          'page_size'):
                 assert getattr(self, attr, None) is None, \
                     'You cannot specify both {} and viewset'.format(attr)
-        else:
+        elif not settings.LAZY_ENDPOINTS:
             self.get_viewset()
 
         if self.model is None:
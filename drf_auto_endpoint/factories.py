@@ -1,3 +1,8 @@
+from collections import OrderedDict
+from functools import update_wrapper
+from threading import RLock
+from weakref import WeakKeyDictionary
+
 from rest_framework import pagination, serializers
 from rest_framework.filters import OrderingFilter, SearchFilter
 
@@ -10,9 +15,16 @@ from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.db.models.fields import NOT_PROVIDED
 
+from .querysets import optimize_queryset
+from .utils import get_viewset_actions
+from .views import ListSerializerMixin, MetadataETagMixin, ReadQuerysetMixin, SparseFieldsetsMixin, ValuesReadMixin
+
 
 class NullToDefaultMixin(object):
 
+    # only changes fields depending on the model (see `GetFieldDict.has_dynamic_fields`)
+    _static_fields = True
+
     def __init__(self, *args, **kwargs):
         super(NullToDefaultMixin, self).__init__(*args, **kwargs)
         for field in self.Meta.fields:
@@ -36,7 +48,15 @@ class NullToDefaultMixin(object):
         return super(NullToDefaultMixin, self).validate(data)
 
 
+_serializers = {}
+_serializers_lock = RLock()
+
+
 def serializer_factory(endpoint=None, fields=None, base_class=None, model=None):
+    """
+    Returns a serializer class for `endpoint` (or `model`).
+    Identical specifications (same model, fields and base class) share the same class.
+    """
 
     if model is not None:
         assert endpoint is None, "You cannot specify both a model and an endpoint"
@@ -52,6 +72,19 @@ def serializer_factory(endpoint=None, fields=None, base_class=None, model=None):
         'model': endpoint.model,
         'fields': fields if fields is not None else endpoint.get_fields_for_serializer()
     }
+
+    key = (
+        endpoint.model,
+        meta_attrs['fields'] if isinstance(meta_attrs['fields'], str) else tuple(meta_attrs['fields']),
+        base_class
+    )
+    try:
+        return _serializers[key]
+    except KeyError:
+        pass
+    except TypeError:
+        # unhashable fields, don't share this serializer
+        key = None
     meta_parents = (object, )
     if hasattr(base_class, 'Meta'):
         meta_parents = (base_class.Meta, ) + meta_parents
@@ -82,10 +115,74 @@ def serializer_factory(endpoint=None, fields=None, base_class=None, model=None):
                 cls_attrs[meta_field] = serializers.ReadOnlyField()
 
     try:
-        return type(cls_name, (NullToDefaultMixin, base_class, ), cls_attrs)
+        rv = type(cls_name, (NullToDefaultMixin, base_class, ), cls_attrs)
     except TypeError:
         # MRO issue, let's try the other way around
-        return type(cls_name, (base_class, NullToDefaultMixin, ), cls_attrs)
+        rv = type(cls_name, (base_class, NullToDefaultMixin, ), cls_attrs)
+
+    if key is not None:
+        with _serializers_lock:
+            rv = _serializers.setdefault(key, rv)
+    return rv
+
+
+_sparse_serializers = WeakKeyDictionary()
+_sparse_serializers_lock = RLock()
+
+
+def sparse_serializer_factory(serializer_class, field_names):
+    """
+    Returns a subclass of `serializer_class` only rendering `field_names`.
+    Classes are cached per serializer class and combination of fields.
+    """
+    field_names = tuple(field_names)
+    try:
+        return _sparse_serializers[serializer_class][field_names]
+    except KeyError:
+        pass
+
+    def get_fields(self):
+        fields = super(rv, self).get_fields()
+        return OrderedDict((name, field) for name, field in fields.items() if name in field_names)
+
+    cls_attrs = {'get_fields': get_fields, '_static_fields': True}
+    meta = getattr(serializer_class, 'Meta', None)
+    if isinstance(getattr(meta, 'fields', None), (list, tuple)):
+        cls_attrs['Meta'] = type('Meta', (meta, ), {
+            'fields': tuple(name for name in meta.fields if name in field_names)
+        })
+
+    rv = type(serializer_class.__name__, (serializer_class, ), cls_attrs)
+    with _sparse_serializers_lock:
+        return _sparse_serializers.setdefault(serializer_class, {}).setdefault(field_names, rv)
+
+
+_sparse_querysets = WeakKeyDictionary()
+_sparse_querysets_lock = RLock()
+
+
+def sparse_queryset_factory(endpoint, serializer_class):
+    """
+    Returns the queryset of the viewset generated for `endpoint` narrowed to what `serializer_class`
+    (a serializer returned by `sparse_serializer_factory`) needs.
+    Querysets are cached per serializer class (hence per combination of fields) and endpoint.
+    """
+    try:
+        return _sparse_querysets[serializer_class][endpoint]
+    except KeyError:
+        pass
+
+    queryset = queryset_factory(endpoint, serializer_class)
+    with _sparse_querysets_lock:
+        return _sparse_querysets.setdefault(serializer_class, WeakKeyDictionary()).setdefault(endpoint, queryset)
+
+
+def list_serializer_factory(endpoint):
+    """
+    Returns a serializer only rendering the primary key and the fields listed by `get_list_display()`
+    """
+    field_names = [endpoint.model._meta.pk.name] + list(endpoint.get_list_display())
+    return sparse_serializer_factory(endpoint.get_serializer(), field_names)
 
 
 def pagination_factory(endpoint):
@@ -147,15 +244,36 @@ def filter_factory(endpoint):
     return type(cls_name, (base_class, ), cls_attrs)
 
 
-def viewset_factory(endpoint):
-    from .endpoints import BaseEndpoint
+def queryset_factory(endpoint, serializer=None, project=True):
+    """
+    Returns the queryset of the viewset generated for `endpoint` (to render it with `serializer`).
+    Unless `optimize_queryset` is disabled, related objects needed by the serializer are selected or prefetched
+    and, if `project` is set, only the columns it needs are loaded.
+    Instances loaded from a projected queryset only save their loaded fields: it is only used by read actions.
+    """
+    queryset = getattr(endpoint, 'queryset', None)
+    auto = queryset is None and getattr(endpoint, 'optimize_queryset', True)
+    if queryset is None:
+        queryset = endpoint.model.objects.all()
+
+    return optimize_queryset(
+        queryset,
+        endpoint.get_serializer() if serializer is None else serializer,
+        select_related=getattr(endpoint, 'select_related', None),
+        prefetch_related=getattr(endpoint, 'prefetch_related', None),
+        only=getattr(endpoint, 'only_fields', None) if project else (),
+        auto=auto
+    )
+
 
+def viewset_factory(endpoint):
     base_viewset = endpoint.get_base_viewset()
 
     cls_name = '{}ViewSet'.format(endpoint.model.__name__)
     tmp_cls_attrs = {
         'serializer_class': endpoint.get_serializer(),
-        'queryset': endpoint.model.objects.all() if getattr(endpoint, 'queryset', None) is None else endpoint.queryset,
+        'queryset': None if getattr(base_viewset, 'queryset', None) is not None else
+        queryset_factory(endpoint, project=False),
         'endpoint': endpoint,
         '__doc__': base_viewset.__doc__
     }
@@ -230,13 +348,127 @@ def viewset_factory(endpoint):
     else:
         cls_attrs['pagination_class'] = pagination_factory(endpoint)
 
-    rv = type(cls_name, (endpoint.get_base_viewset(),), cls_attrs)
+    bases = (endpoint.get_base_viewset(), )
+    if not issubclass(bases[0], MetadataETagMixin):
+        bases = (MetadataETagMixin, ) + bases
+    if cls_attrs.get('queryset', None) is not None:
+        if not issubclass(base_viewset, ReadQuerysetMixin):
+            bases = (ReadQuerysetMixin, ) + bases
+        cls_attrs['read_queryset'] = queryset_factory(endpoint)
+    list_serializer = endpoint.get_list_serializer() if hasattr(endpoint, 'get_list_serializer') else None
+    if list_serializer is not None and getattr(base_viewset, 'list_serializer_class', None) is None:
+        if not issubclass(base_viewset, ListSerializerMixin):
+            bases = (ListSerializerMixin, ) + bases
+        cls_attrs['list_serializer_class'] = list_serializer
+        if cls_attrs.get('queryset', None) is not None:
+            cls_attrs['list_queryset'] = queryset_factory(endpoint, list_serializer)
+    if getattr(endpoint, 'sparse_fieldsets', False) and not issubclass(bases[-1], SparseFieldsetsMixin):
+        bases = (SparseFieldsetsMixin, ) + bases
+        cls_attrs['narrow_queryset'] = cls_attrs.get('queryset', None) is not None and \
+            getattr(endpoint, 'queryset', None) is None and getattr(endpoint, 'optimize_queryset', True)
+    if getattr(endpoint, 'read_from_values', False) and endpoint.read_only and \
+            not issubclass(bases[-1], ValuesReadMixin):
+        bases = (ValuesReadMixin, ) + bases
+
+    rv = type(cls_name, bases, cls_attrs)
+
+    for method_name, method in get_endpoint_actions(endpoint):
+        setattr(rv, method_name, method)
+
+    get_viewset_actions(rv)
+
+    return rv
+
+
+def get_endpoint_actions(endpoint):
+    """
+    Returns the `(name, method)` pairs of the actions declared on `endpoint` which are copied on its viewset
+    """
+    from .endpoints import BaseEndpoint
 
     black_list = dir(BaseEndpoint)
+    rv = []
     for method_name in dir(endpoint):
         if method_name not in black_list:
-            method = getattr(endpoint, method_name)
+            # look the attribute up on the class first so that properties aren't evaluated
+            method = getattr(endpoint.__class__, method_name, None)
             if getattr(method, 'action_type', None) in ['custom', 'bulk', 'list']:
-                setattr(rv, method_name, method)
-
+                rv.append((method_name, getattr(endpoint, method_name)))
     return rv
+
+
+class LazyViewSetMeta(type):
+    """
+    Delegates attribute access on a lazy viewset to the viewset of its endpoint.
+    The attributes the router needs to build its urls are read from the base viewset
+    as long as the actual viewset hasn't been built.
+    """
+
+    route_attributes = ('lookup_field', 'lookup_url_kwarg', 'lookup_value_regex', 'list', 'create',
+                        'retrieve', 'update', 'partial_update', 'destroy')
+
+    def __getattr__(cls, name):
+        endpoint = cls.__dict__['endpoint']
+        if name.startswith('__') or (endpoint.viewset is None and name in cls.route_attributes):
+            return getattr(endpoint.get_base_viewset(), name)
+        return getattr(endpoint.get_viewset(), name)
+
+
+class LazyView(object):
+    """
+    The view returned by the `as_view` of lazy viewsets: the actual view is built on its first call.
+    `cls` is the actual viewset, so that introspection (eg: schema generation) sees an `APIView`.
+    """
+
+    csrf_exempt = True
+
+    def __init__(self, endpoint, actions, initkwargs):
+        self.endpoint = endpoint
+        self.actions = actions
+        self.initkwargs = initkwargs
+        self._view = None
+
+    @property
+    def cls(self):
+        return self.endpoint.get_viewset()
+
+    def __call__(self, request, *args, **kwargs):
+        if self._view is None:
+            self._view = self.cls.as_view(self.actions, **self.initkwargs)
+        return self._view(request, *args, **kwargs)
+
+
+def lazy_viewset_factory(endpoint):
+    """
+    Returns a stand-in for the viewset of `endpoint` which can be registered on a router.
+    The serializer and viewset of the endpoint are only built the first time a request is dispatched
+    to it (or when its metadata is needed).
+    """
+
+    endpoint_actions = get_endpoint_actions(endpoint)
+
+    def get_extra_actions(cls):
+        if endpoint.viewset is not None:
+            return endpoint.viewset.get_extra_actions()
+        actions = {action.__name__: action for action in endpoint.get_base_viewset().get_extra_actions()}
+        actions.update(
+            (method_name, method)
+            for method_name, method in endpoint_actions
+            if hasattr(method, 'mapping')
+        )
+        return [actions[method_name] for method_name in sorted(actions)]
+
+    def new(cls, *args, **kwargs):
+        return endpoint.get_viewset()(*args, **kwargs)
+
+    def as_view(cls, actions=None, **initkwargs):
+        return update_wrapper(LazyView(endpoint, actions, initkwargs), cls, updated=())
+
+    cls_attrs = dict(endpoint_actions)
+    cls_attrs.update({
+        'endpoint': endpoint,
+        '__new__': new,
+        'get_extra_actions': classmethod(get_extra_actions),
+        'as_view': classmethod(as_view),
+    })
+    return LazyViewSetMeta('Lazy{}ViewSet'.format(endpoint.model.__name__), (object, ), cls_attrs)
@@ -0,0 +1,88 @@
+import json
+import os
+import warnings
+from threading import RLock
+
+from django.conf import settings as django_settings
+
+
+def get_fieldsets_path(endpoint_class):
+    return os.path.join(
+        django_settings.BASE_DIR,
+        endpoint_class._fieldsets_location,
+        endpoint_class.__module__.rsplit('.', 1)[0],
+        'fieldsets.json'
+    )
+
+
+class FieldsetsStore(object):
+    """
+    Parses each `fieldsets.json` file once and caches its content by path.
+    When DEBUG is on, files are re-parsed if their modification time changed.
+    """
+
+    def __init__(self):
+        self._files = {}
+        self._reported = set()
+        self._lock = RLock()
+
+    def load(self, path):
+        """
+        Returns the content of the file at `path` or `None` if it doesn't exist
+        """
+        cached = self._files.get(path, None)
+        if cached is not None and not django_settings.DEBUG:
+            return cached[1]
+
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        content = None
+        if mtime is not None:
+            with open(path, 'r') as f:
+                content = json.load(f)
+
+        with self._lock:
+            self._files[path] = (mtime, content)
+        return content
+
+    def get(self, path, key, required=False):
+        """
+        Returns the fieldsets stored under `key` in the file at `path` (or `None`).
+        Missing `required` keys and values which are not lists are reported (once).
+        """
+        content = self.load(path)
+        if content is None:
+            return None
+
+        if key not in content:
+            if required:
+                self.report(path, key, 'no "{}" key in {}'.format(key, path))
+            return None
+
+        value = content[key]
+        if not isinstance(value, list):
+            self.report(path, key, '"{}" in {} should be a list of fields, got {}'.format(
+                key, path, type(value).__name__
+            ))
+        return value
+
+    def report(self, path, key, message):
+        with self._lock:
+            if (path, key) in self._reported:
+                return
+            self._reported.add((path, key))
+        warnings.warn(message)
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+            self._reported.clear()
+
+
+fieldsets_store = FieldsetsStore()
@@ -1,36 +1,100 @@
+from weakref import WeakKeyDictionary
+
 from django.core.exceptions import FieldDoesNotExist
 from django.db.models.fields import NOT_PROVIDED
-from django.utils.module_loading import import_string
+from django.test.signals import setting_changed
 
 from rest_framework import serializers, relations
 from rest_framework.fields import empty, ChoiceField
 
-from inflector import Inflector
-
 from .app_settings import settings
+from .inflectors import get_inflector
+from .widgets import get_widget
+
+
+class QuerysetChoices(list):
+    """
+    Choices built from a queryset: a list of `{'label': ..., 'value': ...}` dicts
+    which compiled fields evaluate again each time a field dict is produced
+    """
+
+    __slots__ = ('qs', 'key_attr', 'from_serializer')
+
+    def __init__(self, qs, key_attr='id'):
+        self.qs = qs
+        self.key_attr = key_attr
+        self.from_serializer = False
+        super(QuerysetChoices, self).__init__(self.evaluate())
+
+    def evaluate(self, field_instance=None):
+        qs = field_instance.queryset if self.from_serializer and field_instance is not None else self.qs
+        return [
+            {
+                'label': record.__str__(),
+                'value': getattr(record, self.key_attr)
+            } for record in qs.all()
+        ]
+
+
+class CompiledField(object):
+    """
+    The request-independent part of the dict describing a serializer field.
+    `stamp` produces the actual dict, evaluating what may change between calls.
+    """
+
+    __slots__ = ('template', 'dynamic_required', 'qs_choices', 'serializer_choices')
+
+    def __init__(self, template, dynamic_required, qs_choices, serializer_choices):
+        self.template = template
+        self.dynamic_required = dynamic_required
+        self.qs_choices = qs_choices
+        self.serializer_choices = serializer_choices
+
+    def stamp(self, get_field_dict, name, field_instance):
+        rv = dict(self.template)
+        for key in ('ui', 'validation', 'extra', 'related_endpoint'):
+            if key in rv:
+                rv[key] = dict(rv[key])
+
+        rv['read_only'] = get_field_dict.get_read_only(name, field_instance)
+        rv['write_only'] = get_field_dict.get_write_only(name, field_instance)
+        if self.dynamic_required:
+            rv['validation']['required'] = field_instance.required
 
+        if self.qs_choices is not None:
+            rv['choices'] = self.qs_choices.evaluate(field_instance)
+        elif self.serializer_choices:
+            get_field_dict.update_choices_from_serializer(rv, field_instance)
 
-inflector_language = import_string(settings.INFLECTOR_LANGUAGE)
-inflector = Inflector(inflector_language)
+        get_field_dict.normalize_default(rv, field_instance)
+        return rv
 
 
 class GetFieldDict():
 
+    attrs_to_validation = (
+        ('min_length', 'min'),
+        ('max_length', 'max'),
+        ('min_value', 'min'),
+        ('max_value', 'max'),
+    )
+
+    def __init__(self):
+        self._compiled = WeakKeyDictionary()
+
     def __call__(self, *args, **kwargs):
         return self.dict_for_field(*args, **kwargs)
 
+    def clear(self):
+        self._compiled = WeakKeyDictionary()
+
     def get_validation_attrs(self, instance_field):
         rv = {}
 
-        attrs_to_validation = {
-            'min_length': 'min',
-            'max_length': 'max',
-            'min_value': 'min',
-            'max_value': 'max'
-        }
-        for attr_name, validation_name in attrs_to_validation.items():
-            if getattr(instance_field, attr_name, None) is not None:
-                rv[validation_name] = getattr(instance_field, attr_name)
+        for attr_name, validation_name in self.attrs_to_validation:
+            value = getattr(instance_field, attr_name, None)
+            if value is not None:
+                rv[validation_name] = value
 
         return rv
 
@@ -56,7 +120,7 @@ class GetFieldDict():
 
         return {
             'key': name,
-            'type': settings.WIDGET_MAPPING[field_instance.__class__.__name__],
+            'type': get_widget(field_instance.__class__),
             'read_only': read_only,
             'write_only': write_only,
             'ui': {
@@ -129,18 +193,14 @@ class GetFieldDict():
         rv['related_endpoint'] = {
             'app': related_model._meta.app_label,
             'singular': related_model._meta.model_name.lower(),
-            'plural': inflector.pluralize(related_model._meta.model_name.lower())
+            'plural': get_inflector().pluralize(related_model._meta.model_name.lower())
         }
 
     def set_choices_from_qs(self, rv, qs, key_attr='id'):
         rv['type'] = settings.WIDGET_MAPPING['choice']
 
-        rv['choices'] = [
-            {
-                'label': record.__str__(),
-                'value': getattr(record, key_attr)
-            } for record in qs.all()
-        ]
+        # evaluated again by `CompiledField.stamp`
+        rv['choices'] = QuerysetChoices(qs, key_attr)
 
     def update_realtionship_from_model(self, rv, model_field, foreign_key_as_list):
         if model_field is None:
@@ -154,7 +214,7 @@ class GetFieldDict():
             rv['validation']['required'] = False
 
         if not foreign_key_as_list:
-            rv['type'] = settings.WIDGET_MAPPING[model_field.__class__.__name__]
+            rv['type'] = get_widget(model_field.__class__)
             self.update_related_endpoint(rv, related_model)
         else:
             # FIXME: we may not need this code as the serializer field has a 'choices' attribute
@@ -203,17 +263,34 @@ class GetFieldDict():
             } for k, v in field_instance.choices.items()
         ]
 
-    def dict_for_field(self, field, serializer_instance, translated_fields=None, fields_annotation=False,
-                       model=None, foreign_key_as_list=False):
-        if translated_fields is None:
-            translated_fields = []
-
-        name = field['name'] if isinstance(field, dict) else field
-        try:
-            field_instance = serializer_instance.fields[name]
-        except KeyError:
-            return {'key': name}
+    def has_dynamic_fields(self, serializer_class):
+        """
+        Whether instances of `serializer_class` may alter their fields (eg: depending on the request),
+        in which case their field dicts aren't compiled.
+        Serializers overriding `__init__` or `get_fields` are considered dynamic unless they set `_static_fields`.
+        """
+        for klass in serializer_class.__mro__[:-1]:
+            # DRF's own serializers
+            if getattr(serializers, klass.__name__, None) is klass or vars(klass).get('_static_fields', False):
+                continue
+            if '__init__' in vars(klass) or 'get_fields' in vars(klass):
+                return True
+        return False
 
+    def get_compiled_key(self, name, field_instance, translated_fields, fields_annotation, model,
+                         foreign_key_as_list):
+        annotation = None
+        if fields_annotation and name in fields_annotation:
+            annotation = tuple(
+                (key, fields_annotation[name][key])
+                for key in ('placeholder', 'help')
+                if key in fields_annotation[name]
+            )
+        return (name, model, field_instance.__class__, bool(foreign_key_as_list), name in translated_fields,
+                annotation)
+
+    def compile_field(self, name, field_instance, serializer_instance, translated_fields, fields_annotation, model,
+                      foreign_key_as_list):
         model_field = self.get_model_field(field_instance, model)
 
         rv = self.get_base_dict_for_field(name, field_instance, translated_fields, serializer_instance)
@@ -221,7 +298,6 @@ class GetFieldDict():
 
         self.update_default_from_model(rv, model_field)
         self.update_default_from_serializer(rv, field_instance)
-        self.normalize_default(rv, field_instance)
 
         self.update_label(rv, model_field)
 
@@ -232,8 +308,74 @@ class GetFieldDict():
 
         rv['validation'].update(self.get_validation_attrs(field_instance))
 
+        qs_choices = rv.get('choices', None)
+        if isinstance(qs_choices, QuerysetChoices):
+            qs_choices.from_serializer = qs_choices.qs is getattr(field_instance, 'queryset', None)
+        else:
+            qs_choices = None
+
+        return CompiledField(
+            template=rv,
+            dynamic_required=rv['validation']['required'] == field_instance.required,
+            qs_choices=qs_choices,
+            serializer_choices=qs_choices is None and 'choices' in rv and isinstance(field_instance, ChoiceField),
+        )
+
+    def get_compiled_field(self, name, field_instance, serializer_instance, translated_fields, fields_annotation,
+                           model, foreign_key_as_list):
+        key = self.get_compiled_key(name, field_instance, translated_fields, fields_annotation, model,
+                                    foreign_key_as_list)
+        serializer_class = serializer_instance.__class__
+
+        try:
+            compiled_fields = self._compiled[serializer_class]
+        except KeyError:
+            compiled_fields = self._compiled.setdefault(
+                serializer_class, None if self.has_dynamic_fields(serializer_class) else {}
+            )
+
+        if compiled_fields is None:
+            return self.compile_field(name, field_instance, serializer_instance, translated_fields,
+                                      fields_annotation, model, foreign_key_as_list)
+
+        try:
+            return compiled_fields[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable annotation
+            return self.compile_field(name, field_instance, serializer_instance, translated_fields,
+                                      fields_annotation, model, foreign_key_as_list)
+
+        compiled = self.compile_field(name, field_instance, serializer_instance, translated_fields,
+                                      fields_annotation, model, foreign_key_as_list)
+        compiled_fields[key] = compiled
+        return compiled
+
+    def dict_for_field(self, field, serializer_instance, translated_fields=None, fields_annotation=False,
+                       model=None, foreign_key_as_list=False):
+        if translated_fields is None:
+            translated_fields = []
+
+        name = field['name'] if isinstance(field, dict) else field
+        try:
+            field_instance = serializer_instance.fields[name]
+        except KeyError:
+            return {'key': name}
+
+        compiled = self.get_compiled_field(name, field_instance, serializer_instance, translated_fields,
+                                           fields_annotation, model, foreign_key_as_list)
+        rv = compiled.stamp(self, name, field_instance)
+
         self.update_extra(rv, field)
         return rv
 
 
 get_field_dict = GetFieldDict()
+
+
+def clear_compiled_fields(**kwargs):
+    get_field_dict.clear()
+
+
+setting_changed.connect(clear_compiled_fields)
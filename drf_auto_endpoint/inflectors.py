@@ -0,0 +1,47 @@
+from functools import lru_cache
+from threading import RLock
+
+from django.utils.module_loading import import_string
+
+from inflector import Inflector
+
+from .app_settings import settings
+
+
+class CachedInflector(Inflector):
+    """
+    An `Inflector` memoizing the results of `pluralize` and `singularize`
+    """
+
+    cache_size = 1024
+
+    def __init__(self, language):
+        super(CachedInflector, self).__init__(language)
+        self.pluralize = lru_cache(maxsize=self.cache_size)(self.pluralize)
+        self.singularize = lru_cache(maxsize=self.cache_size)(self.singularize)
+
+
+_inflectors = {}
+_lock = RLock()
+
+
+def get_inflector(language=None):
+    """
+    Returns the shared inflector for `language` (a class or its import path),
+    defaults to `INFLECTOR_LANGUAGE`
+    """
+    if language is None:
+        language = settings.INFLECTOR_LANGUAGE
+
+    try:
+        return _inflectors[language]
+    except KeyError:
+        pass
+
+    language_class = import_string(language) if isinstance(language, str) else language
+    with _lock:
+        # the same inflector is used whether the language is given as a class or as an import path
+        if language_class not in _inflectors:
+            _inflectors[language_class] = CachedInflector(language_class)
+        _inflectors[language] = _inflectors[language_class]
+        return _inflectors[language]
@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from drf_auto_endpoint.profiling import PHASES, registration_profiler
+
+
+class Command(BaseCommand):
+    help = 'Report the time spent registering each endpoint (requires DRF_AUTO_PROFILE_REGISTRATION=1)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--build', default=False, action='store_true',
+                            help='Build the serializer and viewset of endpoints which have not been built yet '
+                                 '(eg: with DRF_AUTO_LAZY_ENDPOINTS)')
+        parser.add_argument('--json', default=None,
+                            help='Path of a file to dump the report to as JSON')
+        parser.add_argument('--limit', default=None, type=int,
+                            help='Only print the N slowest endpoints')
+        parser.add_argument('--router', default='drf_auto_endpoint.router.router',
+                            help='Defaults to drf_auto_endpoint.router.router')
+
+    def handle(self, *args, **options):
+        if not registration_profiler.enabled:
+            raise CommandError('Registration profiling is disabled, set DRF_AUTO_PROFILE_REGISTRATION=1 '
+                               'in your environment (or DRF_AUTO_PROFILE_REGISTRATION = True in your settings)')
+
+        if options['build']:
+            router = import_string(options['router'])
+            for endpoint in getattr(router, '_endpoints', {}).values():
+                endpoint.get_serializer()
+                endpoint.get_viewset()
+
+        report = registration_profiler.report()
+
+        if options['json'] is not None:
+            with open(options['json'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        columns = ('total', ) + PHASES
+        width = max([len('endpoint')] + [len(item['endpoint']) for item in report])
+        self.stdout.write('{}  {}'.format(
+            'endpoint'.ljust(width),
+            '  '.join(column.rjust(max(len(column), 12)) for column in columns)
+        ))
+        for item in report[:options['limit']]:
+            timings = [item['total']] + [item['phases'][phase] for phase in PHASES]
+            self.stdout.write('{}  {}'.format(
+                item['endpoint'].ljust(width),
+                '  '.join('{:.2f} ms'.format(timing * 1000).rjust(max(len(column), 12))
+                          for column, timing in zip(columns, timings))
+            ))
+        self.stdout.write('{} endpoint(s), {:.2f} ms'.format(
+            len(report),
+            sum(item['total'] for item in report) * 1000
+        ))
@@ -1,76 +1,179 @@
-from collections import defaultdict
+import hashlib
+import json
 
-from django.utils.module_loading import import_string
+from django.utils.translation import get_language
 
 from rest_framework.metadata import SimpleMetadata, BaseMetadata
+from rest_framework.utils.encoders import JSONEncoder
 
 from .utils import get_languages, get_field_dict
 from .app_settings import settings
-from .adapters import GETTER
+from .adapters import GETTER, adapter_registry
+from .cache import metadata_cache
+from .widgets import get_widget
+from .renderers import encode_json, merge_encoded, pre_encoded
+
+
+def compute_etag(data):
+    content = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+    return '"{}"'.format(hashlib.md5(content.encode('utf-8')).hexdigest())
+
+
+class AdaptedMetadata(object):
+    """
+    Adapted metadata for an endpoint along with its (lazily computed) ETag
+    and JSON encoding
+    """
+
+    __slots__ = ('data', '_etag', '_encoded')
+
+    def __init__(self, data):
+        self.data = data
+        self._etag = None
+        self._encoded = None
+
+    @property
+    def etag(self):
+        if self._etag is None:
+            self._etag = compute_etag(self.data)
+        return self._etag
+
+    @property
+    def encoded(self):
+        if self._encoded is None:
+            self._encoded = encode_json(self.data)
+        return self._encoded
 
 
 class AutoMetadataMixin(object):
 
     def root_metadata(self, metadata, view):
         from .router import router
-        rv = {
-            'endpoints': [k for k in router._endpoints.keys()]
-        }
-
-        applications = defaultdict(lambda: [])
-        for url, endpoint in router._endpoints.items():
-            if endpoint.list_me:
-                applications[endpoint.application_name].append({
-                    'name': endpoint.model_name,
-                    'singular': endpoint.singular_model_name,
-                    'endpoint': url
-                })
-        rv['applications'] = [
-            {
-                'name': k,
-                'models': v
-            } for k, v in applications.items()
-
-        ]
+        rv = dict(router.get_root_metadata())
         rv['languages'] = get_languages()
 
-        adapter = import_string(settings.METADATA_ADAPTER)()
+        adapter = adapter_registry.get()
         metadata.update(adapter.render_root(rv))
         return metadata
 
     def get_field_dict(self, *args, **kwargs):
         return get_field_dict(*args, **kwargs)
 
-    def determine_metadata(self, request, view):
+    def get_endpoint(self, view):
+        if hasattr(view, 'endpoint'):
+            return view.endpoint
+
+        serializer = view.get_serializer_class()
+        if hasattr(serializer, 'Meta') and hasattr(serializer.Meta, 'model'):
+            from .endpoints import Endpoint
+            return Endpoint(serializer.Meta.model, viewset=view)
+
+        return None
+
+    def get_cache_key(self, request, view, endpoint, adapter):
+        from .router import router
+        from .endpoints import BaseEndpoint
+
+        if endpoint is None or not metadata_cache.enabled or not hasattr(view, 'endpoint'):
+            return None
+
+        url = endpoint.get_url()
+        if router._endpoints.get(url, None) is not endpoint:
+            # Only registered endpoints have a stable identity
+            return None
 
+        vary_key = None
+        if endpoint.metadata_vary_on is not None or \
+                type(endpoint).get_metadata_vary_key is not BaseEndpoint.get_metadata_vary_key:
+            if request is None:
+                return None
+            vary_key = endpoint.get_metadata_vary_key(request)
+        elif type(endpoint).get_serializer_instance is not BaseEndpoint.get_serializer_instance:
+            # Metadata for this endpoint depends on the request in an undeclared way
+            return None
+
+        return (url, adapter.__class__, get_language(), vary_key)
+
+    def get_base_metadata(self, request, view):
         try:
-            metadata = super(AutoMetadataMixin, self).determine_metadata(request, view)
+            return super(AutoMetadataMixin, self).determine_metadata(request, view)
         except NotImplementedError:
-            metadata = {}
+            return {}
         except AttributeError:
-            metadata = {}
+            return {}
 
+    def is_root_view(self, view):
         root_view_names = ['APIRootView', 'APIRoot']
-        if view.__class__.__name__ in root_view_names or view in root_view_names:
-            return self.root_metadata(metadata, view)
+        return view.__class__.__name__ in root_view_names or view in root_view_names
+
+    def get_adapted_metadata(self, request, view):
+        endpoint = self.get_endpoint(view)
+        adapter = adapter_registry.get(getattr(endpoint, 'metadata_adapter', None))
+
+        cache_key = self.get_cache_key(request, view, endpoint, adapter)
+        adapted = None
+        if cache_key is not None:
+            adapted = metadata_cache.get(cache_key)
+        if adapted is None:
+            adapted = AdaptedMetadata(self.determine_adapted_metadata(request, view, endpoint, adapter))
+            if cache_key is not None:
+                metadata_cache.set(cache_key, adapted)
+
+        return adapted
+
+    def merge_metadata(self, metadata, adapted):
+        if not isinstance(adapted, dict):
+            return adapted
+
+        rv = dict(metadata)
+        rv.update(adapted)
+        return rv
+
+    def pre_encode_metadata(self, data, metadata, adapted):
+        """
+        Attaches the JSON encoding of `data` (see `MetadataJSONRenderer`).
+        The memoized encoding of the adapted metadata is reused when possible.
+        """
+        if not settings.PRESERIALIZE_METADATA:
+            return data
+
+        if adapted is None or data is adapted.data:
+            return pre_encoded(data, None if adapted is None else lambda: adapted.encoded)
+
+        if metadata.keys() & adapted.data.keys():
+            return pre_encoded(data)
+        return pre_encoded(data, lambda: merge_encoded(encode_json(metadata), adapted.encoded))
 
-        serializer = view.get_serializer_class()
+    def determine_metadata(self, request, view):
+        return self.determine_metadata_and_etag(request, view, with_etag=False)[0]
 
-        try:
-            serializer_instance = view.get_serializer()
-        except Exception:
-            # Custom viewset is expecting something we can't guess
-            serializer_instance = serializer()
-        endpoint = None
-        if hasattr(view, 'endpoint'):
-            endpoint = view.endpoint
-        else:
-            if hasattr(serializer, 'Meta') and hasattr(serializer.Meta, 'model'):
-                from .endpoints import Endpoint
-                endpoint = Endpoint(serializer.Meta.model, viewset=view)
+    def determine_metadata_and_etag(self, request, view, with_etag=True):
+        metadata = self.get_base_metadata(request, view)
+
+        if self.is_root_view(view):
+            data = self.root_metadata(metadata, view)
+            return self.pre_encode_metadata(data, metadata, None), compute_etag(data) if with_etag else None
+
+        adapted = self.get_adapted_metadata(request, view)
+        data = self.pre_encode_metadata(self.merge_metadata(metadata, adapted.data), metadata, adapted)
+        if not with_etag:
+            return data, None
+        if not isinstance(adapted.data, dict) or not metadata:
+            return data, adapted.etag
+        return data, compute_etag([adapted.etag, metadata])
+
+    def determine_adapted_metadata(self, request, view, endpoint, adapter):
+        metadata = {}
 
-        adapter = import_string(settings.METADATA_ADAPTER)()
         if endpoint is None:
+            serializer = view.get_serializer_class()
+
+            try:
+                serializer_instance = view.get_serializer()
+            except Exception:
+                # Custom viewset is expecting something we can't guess
+                serializer_instance = serializer()
+
             fields_metadata = []
 
             for field in serializer_instance.fields.keys():
@@ -78,7 +181,7 @@ class AutoMetadataMixin(object):
                     continue
 
                 instance_field = serializer_instance.fields[field]
-                type_ = settings.WIDGET_MAPPING.get(instance_field.__class__.__name__)
+                type_ = get_widget.resolve(instance_field.__class__)
 
                 if type_ is None:
                     raise NotImplementedError((settings.WIDGET_MAPPING.keys(), instance_field.__class__.__name__))
@@ -101,25 +204,31 @@ class AutoMetadataMixin(object):
                         }]
                     else:
                         metadata[meta_info.attr] = meta_info.default
+        elif hasattr(endpoint, 'metadata_context'):
+            with endpoint.metadata_context(request, adapter):
+                self.collect_endpoint_metadata(metadata, request, endpoint, adapter)
         else:
-            for meta_info in adapter.metadata_info:
-                if meta_info.attr_type == GETTER:
-                    method_name = 'get_{}'.format(meta_info.attr)
-                    if not hasattr(endpoint, method_name):
-                        metadata[meta_info.attr] = meta_info.default
-                        continue
-                    method = getattr(endpoint, method_name)
-                    try:
-                        metadata[meta_info.attr] = method(request)
-                    except TypeError:
-                        metadata[meta_info.attr] = method()
-                elif hasattr(endpoint, meta_info.attr):
-                    metadata[meta_info.attr] = getattr(endpoint, meta_info.attr, meta_info.default)
-                else:
-                    metadata[meta_info.attr] = meta_info.default
+            self.collect_endpoint_metadata(metadata, request, endpoint, adapter)
 
         return adapter(metadata)
 
+    def collect_endpoint_metadata(self, metadata, request, endpoint, adapter):
+        for meta_info in adapter.metadata_info:
+            if meta_info.attr_type == GETTER:
+                method_name = 'get_{}'.format(meta_info.attr)
+                if not hasattr(endpoint, method_name):
+                    metadata[meta_info.attr] = meta_info.default
+                    continue
+                method = getattr(endpoint, method_name)
+                try:
+                    metadata[meta_info.attr] = method(request)
+                except TypeError:
+                    metadata[meta_info.attr] = method()
+            elif hasattr(endpoint, meta_info.attr):
+                metadata[meta_info.attr] = getattr(endpoint, meta_info.attr, meta_info.default)
+            else:
+                metadata[meta_info.attr] = meta_info.default
+
 
 class AutoMetadata(AutoMetadataMixin, SimpleMetadata):
     pass
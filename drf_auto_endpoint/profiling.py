@@ -0,0 +1,90 @@
+import os
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from threading import RLock, local
+from time import perf_counter
+
+from .app_settings import settings
+
+
+PHASES = ('metaclass', 'fieldsets', 'wizard', 'serializer_factory', 'viewset_factory', 'register')
+
+
+def get_profile_label(endpoint):
+    """
+    Returns the name under which the registration timings of `endpoint` (a class or an instance) are reported
+    """
+    endpoint_class = endpoint if isinstance(endpoint, type) else endpoint.__class__
+    label = '{}.{}'.format(endpoint_class.__module__, endpoint_class.__qualname__)
+    model = getattr(endpoint, 'model', None)
+    if model is not None and model is not getattr(endpoint_class, 'model', None):
+        label = '{} ({})'.format(label, model._meta.label)
+    return label
+
+
+class RegistrationProfiler(object):
+    """
+    Collects the time spent in each registration phase, per endpoint.
+    Nested phases are only counted once: the time spent in a nested phase is not counted in its parent.
+    """
+
+    def __init__(self):
+        self._timings = OrderedDict()
+        self._lock = RLock()
+        self._local = local()
+
+    @property
+    def enabled(self):
+        if settings.PROFILE_REGISTRATION:
+            return True
+        return os.environ.get('DRF_AUTO_PROFILE_REGISTRATION', '').lower() not in ('', '0', 'false', 'no')
+
+    def add(self, label, phase, duration):
+        with self._lock:
+            timings = self._timings.get(label, None)
+            if timings is None:
+                timings = self._timings[label] = defaultdict(float)
+            timings[phase] += duration
+
+    @contextmanager
+    def measure(self, label, phase):
+        if not self.enabled:
+            yield
+            return
+
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        # each frame holds the time spent in nested phases
+        stack.append(0.0)
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            duration = perf_counter() - started
+            nested = stack.pop()
+            if stack:
+                stack[-1] += duration
+            self.add(label, phase, duration - nested)
+
+    def report(self):
+        """
+        Returns the collected timings (in seconds), slowest endpoint first
+        """
+        with self._lock:
+            rv = [
+                {
+                    'endpoint': label,
+                    'total': sum(timings.values()),
+                    'phases': {phase: timings.get(phase, 0.0) for phase in PHASES},
+                }
+                for label, timings in self._timings.items()
+            ]
+        return sorted(rv, key=lambda item: item['total'], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._timings.clear()
+
+
+registration_profiler = RegistrationProfiler()
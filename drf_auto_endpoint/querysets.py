@@ -0,0 +1,377 @@
+import ast
+import inspect
+import textwrap
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Prefetch
+from django.db.models.query_utils import DeferredAttribute
+
+from rest_framework.fields import Field
+from rest_framework.relations import ManyRelatedField, PKOnlyObject, PrimaryKeyRelatedField, RelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer, Serializer
+
+
+def is_pk_only(field):
+    """
+    Whether `field` only needs the primary key of the related object(s) it represents
+    """
+    if isinstance(field, ManyRelatedField):
+        field = field.child_relation
+    return isinstance(field, PrimaryKeyRelatedField) and field.use_pk_only_optimization()
+
+
+def get_pk_only_queryset(relation):
+    """
+    Returns a queryset only loading the columns needed to prefetch the primary keys of `relation`
+    """
+    related_model = relation.related_model
+    only = [related_model._meta.pk.name]
+    if relation.one_to_many:
+        # the foreign key is needed to match related objects with their instance
+        only.append(relation.field.name)
+    return related_model._default_manager.only(*only)
+
+
+@lru_cache(maxsize=None)
+def get_str_attributes(model):
+    """
+    Returns the chains of attributes read on the instance by the `__str__` method of `model`
+    (eg: `('category', 'name')` for `self.category.name`) or `None` if they can't be found statically
+    """
+    method = model.__str__
+    if method is models.Model.__str__:
+        return (('pk', ), )
+
+    try:
+        tree = ast.parse(textwrap.dedent(inspect.getsource(method)))
+    except (OSError, TypeError, SyntaxError):
+        return None
+
+    function = next((node for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.Lambda))), None)
+    if function is None or len(function.args.args) == 0:
+        return None
+    # the instance isn't necessarily called `self` (eg: `__str__ = describe`)
+    name = function.args.args[0].arg
+
+    chains = set()
+    roots = set()
+    for node in ast.walk(function):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'super':
+            # the parent's __str__ could read anything
+            return None
+        if not isinstance(node, ast.Attribute):
+            continue
+        chain = []
+        while isinstance(node, ast.Attribute):
+            chain.insert(0, node.attr)
+            node = node.value
+        if isinstance(node, ast.Name) and node.id == name:
+            chains.add(tuple(chain))
+            roots.add(node)
+
+    for node in ast.walk(function):
+        if isinstance(node, ast.Name) and node.id == name and node not in roots:
+            # the instance is passed along (eg: to a function), anything could be read
+            return None
+
+    if len(chains) == 0:
+        # nothing is read from the instance directly, it may still be read indirectly
+        return None
+
+    return tuple(sorted(chains))
+
+
+def get_str_relations(model):
+    """
+    Returns the lookups of the forward relations used by the `__str__` method of `model`
+    (as far as they can be found statically)
+    """
+    lookups = set()
+    for chain in get_str_attributes(model) or ():
+        current_model = model
+        path = []
+        for attr in chain:
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                break
+            if not model_field.is_relation or model_field.many_to_many or model_field.one_to_many:
+                break
+            path.append(attr)
+            current_model = model_field.related_model
+        if path:
+            lookups.add('__'.join(path))
+
+    return tuple(sorted(lookups))
+
+
+def get_column(model, attr):
+    """
+    Returns the name of the concrete field to load in order to read `attr` on instances of `model`.
+    Returns `''` if only the primary key is needed and `None` if it can't be known.
+    """
+    if attr == 'pk':
+        return ''
+    try:
+        model_field = model._meta.get_field(attr)
+    except FieldDoesNotExist:
+        # a property, a method or an annotation
+        return None
+    if model_field.concrete:
+        return model_field.name
+    if model_field.auto_created and model_field.is_relation:
+        # reverse relations are looked up using the primary key
+        return ''
+    return None
+
+
+def collect_related_lookups(field, model, select_related, prefetch_related, prefix='', in_prefetch=False):
+    """
+    Adds the lookups needed to represent `field` (bound to a serializer on `model`) without extra queries
+    """
+    if field.write_only:
+        return
+
+    if field.source == '*':
+        if isinstance(field, BaseSerializer) and not isinstance(field, ListSerializer):
+            for child in field.fields.values():
+                collect_related_lookups(child, model, select_related, prefetch_related, prefix, in_prefetch)
+        return
+
+    if field.source == '__str__':
+        for lookup in get_str_relations(model):
+            (prefetch_related if in_prefetch else select_related).append(prefix + lookup)
+        return
+
+    current_model = model
+    path = []
+    attrs = field.source_attrs
+    for index, attr in enumerate(attrs):
+        try:
+            model_field = current_model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            # a property or a method, we can't guess what it needs
+            break
+        if not model_field.is_relation:
+            break
+
+        is_last = index == len(attrs) - 1
+        path.append(attr)
+        lookup = prefix + '__'.join(path)
+
+        if model_field.many_to_many or model_field.one_to_many:
+            nested = field.child if isinstance(field, ListSerializer) else None
+            if is_last and is_pk_only(field) and not in_prefetch:
+                prefetch_related.append(Prefetch(lookup, queryset=get_pk_only_queryset(model_field)))
+            else:
+                prefetch_related.append(lookup)
+                if is_last and isinstance(nested, BaseSerializer):
+                    for child in nested.fields.values():
+                        collect_related_lookups(child, model_field.related_model, select_related,
+                                                prefetch_related, lookup + '__', True)
+            return
+
+        if is_last:
+            if is_pk_only(field) and model_field.concrete:
+                # the primary key is read from the foreign key column
+                path.pop()
+                break
+            (prefetch_related if in_prefetch else select_related).append(lookup)
+            if isinstance(field, BaseSerializer):
+                for child in field.fields.values():
+                    collect_related_lookups(child, model_field.related_model, select_related, prefetch_related,
+                                            lookup + '__', in_prefetch)
+            return
+
+        current_model = model_field.related_model
+
+    if path:
+        (prefetch_related if in_prefetch else select_related).append(prefix + '__'.join(path))
+
+
+def get_related_lookups(serializer, model):
+    """
+    Returns the `select_related` and `prefetch_related` lookups needed to represent instances of `model`
+    with `serializer` (a serializer class or instance)
+    """
+    if isinstance(serializer, type):
+        serializer = serializer()
+
+    select_related = []
+    prefetch_related = []
+    for field in serializer.fields.values():
+        collect_related_lookups(field, model, select_related, prefetch_related)
+
+    # remove duplicates and lookups already covered by a longer select_related
+    select_related = [
+        lookup for index, lookup in enumerate(select_related)
+        if lookup not in select_related[:index] and
+        not any(other.startswith(lookup + '__') for other in select_related)
+    ]
+    seen = set()
+    unique_prefetch_related = []
+    for lookup in prefetch_related:
+        name = lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+        if name not in seen:
+            seen.add(name)
+            unique_prefetch_related.append(lookup)
+
+    return select_related, unique_prefetch_related
+
+
+def collect_only_fields(field, model, columns):
+    """
+    Adds the concrete fields of `model` read to represent `field` to `columns`.
+    Returns `False` if they can't be known.
+    """
+    if field.write_only:
+        return True
+
+    if field.source == '*':
+        if isinstance(field, BaseSerializer) and not isinstance(field, ListSerializer):
+            return all(collect_only_fields(child, model, columns) for child in field.fields.values())
+        # eg: SerializerMethodField
+        return False
+
+    if field.source == '__str__':
+        chains = get_str_attributes(model)
+        if not chains:
+            # unknown (or nothing found), only loading the primary key would defer the columns it reads
+            return False
+        attrs = [chain[0] for chain in chains]
+    else:
+        attrs = field.source_attrs[:1]
+
+    for attr in attrs:
+        column = get_column(model, attr)
+        if column is None:
+            return False
+        if column:
+            columns.append(column)
+    return True
+
+
+def get_only_fields(serializer, model):
+    """
+    Returns the concrete fields of `model` needed to represent its instances with `serializer`
+    (a serializer class or instance) or `None` if they can't be known
+    """
+    if isinstance(serializer, type):
+        serializer = serializer()
+
+    columns = [model._meta.pk.name]
+    for field in serializer.fields.values():
+        if not collect_only_fields(field, model, columns):
+            return None
+
+    return list(OrderedDict.fromkeys(columns))
+
+
+def optimize_queryset(queryset, serializer, select_related=None, prefetch_related=None, only=None, auto=True):
+    """
+    Returns `queryset` with the `select_related` and `prefetch_related` lookups needed by `serializer`
+    and only loading the columns it needs.
+    Explicit `select_related`, `prefetch_related` and `only` values replace the ones which would have been computed
+    (an empty `only` loads every column).
+    """
+    auto_select_related = auto_prefetch_related = []
+    if auto and (select_related is None or prefetch_related is None):
+        try:
+            auto_select_related, auto_prefetch_related = get_related_lookups(serializer, queryset.model)
+        except Exception:
+            # The serializer is expecting something we can't guess (eg: a request in its context)
+            pass
+
+    if select_related is None:
+        select_related = auto_select_related
+    if prefetch_related is None:
+        prefetch_related = auto_prefetch_related
+
+    if only is None and auto:
+        try:
+            only = get_only_fields(serializer, queryset.model)
+        except Exception:
+            pass
+
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    if only:
+        only = list(only)
+        # relations which are followed have to be loaded
+        for lookup in list(select_related) + list(prefetch_related):
+            root = (lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup).split('__', 1)[0]
+            column = get_column(queryset.model, root)
+            if column and column not in only:
+                only.append(column)
+        queryset = queryset.only(*only)
+    return queryset
+
+
+def get_values_reader(field, model):
+    """
+    Returns the column of `model` `field` reads and the function turning its (non-null) values into their
+    representation or `None` if `field` needs the instance itself
+    """
+    if isinstance(field, (BaseSerializer, ManyRelatedField)) or len(field.source_attrs) != 1:
+        return None
+
+    attr = field.source_attrs[0]
+    try:
+        model_field = model._meta.pk if attr == 'pk' else model._meta.get_field(attr)
+    except FieldDoesNotExist:
+        # a property, a method or an annotation
+        return None
+    if not model_field.concrete or model_field.many_to_many:
+        return None
+
+    # fields with a custom descriptor (eg: FileField) don't read the column as is
+    descriptor = getattr(model, model_field.attname, None)
+    if not isinstance(descriptor, DeferredAttribute) or type(descriptor).__get__ is not DeferredAttribute.__get__:
+        return None
+
+    if isinstance(field, RelatedField):
+        if not model_field.is_relation or type(field).get_attribute is not RelatedField.get_attribute or \
+                not field.use_pk_only_optimization():
+            return None
+        to_representation = field.to_representation
+        return model_field.attname, lambda value: to_representation(PKOnlyObject(pk=value))
+
+    if type(field).get_attribute is not Field.get_attribute:
+        return None
+    if model_field.is_relation and attr != model_field.attname:
+        # reading the foreign key itself returns the related instance
+        return None
+    return model_field.attname, field.to_representation
+
+
+def get_values_transform(serializer, model):
+    """
+    Returns the columns to pass to `values()` and a function turning each row into the representation
+    `serializer` (an instance) gives of the matching instance of `model`,
+    or `None` if some field needs the instance itself
+    """
+    if not isinstance(serializer, Serializer) or type(serializer).to_representation is not Serializer.to_representation:
+        return None
+
+    readers = []
+    for field in serializer._readable_fields:
+        reader = get_values_reader(field, model)
+        if reader is None:
+            return None
+        readers.append((field.field_name, ) + reader)
+    readers = tuple(readers)
+
+    def to_representation(row):
+        ret = OrderedDict()
+        for field_name, column, convert in readers:
+            value = row[column]
+            ret[field_name] = None if value is None else convert(value)
+        return ret
+
+    columns = list(OrderedDict.fromkeys(column for field_name, column, convert in readers))
+    return columns, to_representation
@@ -0,0 +1,142 @@
+import json
+import math
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class UnportableFloat(Exception):
+    pass
+
+
+def has_unportable_floats(data):
+    """
+    Whether `data` contains floats orjson doesn't encode like the json module:
+    non-finite floats and floats written in exponent notation (`1e-07` vs `1e-7`).
+    """
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, float):
+            if not math.isfinite(obj) or 'e' in repr(obj):
+                return True
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return False
+
+
+def encode_json(data):
+    """
+    Encodes `data` the way DRF's JSONRenderer would (without indentation),
+    using orjson when it is installed and compatible with DRF's settings.
+    Falls back to the json module when `data` holds floats orjson would encode differently.
+    """
+    if orjson is not None and api_settings.UNICODE_JSON and api_settings.COMPACT_JSON and \
+            not has_unportable_floats(data):
+        encoder = JSONEncoder()
+
+        def default(obj):
+            rv = encoder.default(obj)
+            # eg: Decimal instances encoded as floats
+            if has_unportable_floats(rv):
+                raise UnportableFloat()
+            return rv
+
+        try:
+            rv = orjson.dumps(data, default=default,
+                              option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME |
+                              orjson.OPT_PASSTHROUGH_DATACLASS)
+        except orjson.JSONEncodeError as e:
+            if not isinstance(e.__cause__, UnportableFloat):
+                raise
+        else:
+            return rv.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+    rv = json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=not api_settings.UNICODE_JSON,
+        allow_nan=not api_settings.STRICT_JSON,
+        separators=(',', ':') if api_settings.COMPACT_JSON else (', ', ': ')
+    )
+    return rv.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+def get_separators():
+    """
+    Returns the (item, key) separators used by `encode_json` as bytes
+    """
+    if api_settings.COMPACT_JSON:
+        return b',', b':'
+    return b', ', b': '
+
+
+def merge_encoded(*objects):
+    """
+    Merges encoded JSON objects (whose keys are disjoint) into a single one
+    without decoding them.
+    """
+    objects = [obj[1:-1] for obj in objects if obj != b'{}']
+    return b'{' + get_separators()[0].join(objects) + b'}'
+
+
+class PreEncodedMixin(object):
+    """
+    Data which knows its own JSON encoding.
+    The encoding is computed (once) on first access.
+    """
+
+    def __init__(self, data, encode):
+        super(PreEncodedMixin, self).__init__(data)
+        self._encode = encode
+        self._encoded = None
+
+    @property
+    def encoded(self):
+        if self._encoded is None:
+            self._encoded = self._encode()
+        return self._encoded
+
+
+class PreEncodedDict(PreEncodedMixin, dict):
+    pass
+
+
+class PreEncodedList(PreEncodedMixin, list):
+    pass
+
+
+def pre_encoded(data, encode=None):
+    if encode is None:
+        def encode():
+            return encode_json(data)
+
+    if isinstance(data, dict):
+        return PreEncodedDict(data, encode)
+    if isinstance(data, list):
+        return PreEncodedList(data, encode)
+    return data
+
+
+class MetadataJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer which directly outputs the pre-encoded metadata when possible.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, PreEncodedMixin) and \
+                self.get_indent(accepted_media_type, renderer_context or {}) is None and \
+                self.encoder_class is JSONEncoder and \
+                self.ensure_ascii == (not api_settings.UNICODE_JSON) and \
+                self.compact == api_settings.COMPACT_JSON and \
+                self.strict == api_settings.STRICT_JSON:
+            return data.encoded
+
+        return super(MetadataJSONRenderer, self).render(data, accepted_media_type, renderer_context)
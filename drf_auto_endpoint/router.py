@@ -1,20 +1,32 @@
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 
+from django.urls import re_path
 from django.utils.module_loading import import_string
 
 from rest_framework.routers import DefaultRouter
 
 from .endpoints import Endpoint
+from .factories import lazy_viewset_factory
+from .profiling import get_profile_label, registration_profiler
 from .app_settings import settings
+from .cache import metadata_cache
+from .views import APIRootView, BulkMetadataView
 
 
 class EndpointRouter(DefaultRouter):
 
     base_endpoint_class = Endpoint
+    APIRootView = APIRootView
+    BulkMetadataView = BulkMetadataView
+
+    include_bulk_metadata_view = True
+    bulk_metadata_url = '_metadata'
+    bulk_metadata_view_name = 'bulk-metadata'
 
     def __init__(self, *args, **kwargs):
         self._endpoints = OrderedDict()
         self._registry = {}
+        self._root_metadata = None
         super(EndpointRouter, self).__init__(*args, **kwargs)
 
     def register(self, model=None, endpoint=None, fields=None, permission_classes=None,
@@ -51,43 +63,98 @@ class EndpointRouter(DefaultRouter):
         elif isinstance(endpoint, type):
             endpoint = endpoint(**endpoint_kwargs)
 
-        url = endpoint.get_url() if 'url' not in kwargs else kwargs.pop('url')
-        self._endpoints[url] = endpoint
-
-        if base_name is None:
-            base_name = url
-
-        try:
-            super(EndpointRouter, self).register(
-                url,
-                endpoint.get_viewset(),
-                basename=prefix + base_name,
-                **kwargs
-            )
-        except TypeError:
-            # DRF < 3.10
-            super(EndpointRouter, self).register(
-                url,
-                endpoint.get_viewset(),
-                base_name=prefix + base_name,
-                **kwargs
-            )
+        with registration_profiler.measure(get_profile_label(endpoint), 'register'):
+            url = endpoint.get_url() if 'url' not in kwargs else kwargs.pop('url')
+            self._endpoints[url] = endpoint
+            metadata_cache.invalidate(url)
+            self._root_metadata = None
+
+            if base_name is None:
+                base_name = url
+
+            viewset = self.get_registry_viewset(endpoint)
+            try:
+                super(EndpointRouter, self).register(
+                    url,
+                    viewset,
+                    basename=prefix + base_name,
+                    **kwargs
+                )
+            except TypeError:
+                # DRF < 3.10
+                super(EndpointRouter, self).register(
+                    url,
+                    viewset,
+                    base_name=prefix + base_name,
+                    **kwargs
+                )
 
     def override_registry_entry(self, endpoint):
         url = endpoint.get_url()
         self._endpoints[url] = endpoint
+        metadata_cache.invalidate(url)
+        self._root_metadata = None
 
         new_registry = []
         for (prefix, viewset, base_name) in self.registry:
             if prefix == url:
-                new_registry.append((url, endpoint.get_viewset(), base_name))
+                new_registry.append((url, self.get_registry_viewset(endpoint), base_name))
             else:
                 new_registry.append((prefix, viewset, base_name))
         self.registry = new_registry
 
+    def get_registry_viewset(self, endpoint):
+        """
+        Returns the viewset to register for `endpoint`.
+        With `DRF_AUTO_LAZY_ENDPOINTS`, generated viewsets are only built on first use.
+        """
+        if settings.LAZY_ENDPOINTS and endpoint.viewset is None:
+            return lazy_viewset_factory(endpoint)
+        return endpoint.get_viewset()
+
+    def get_urls(self):
+        urls = super(EndpointRouter, self).get_urls()
+
+        if self.include_bulk_metadata_view:
+            view = self.BulkMetadataView.as_view(router=self)
+            urls.insert(0, re_path(r'^{}/$'.format(self.bulk_metadata_url), view,
+                                   name=self.bulk_metadata_view_name))
+
+        return urls
+
     def get_endpoint(self, url):
         return self._endpoints[url]
 
+    def build_root_metadata(self):
+        applications = defaultdict(lambda: [])
+        for url, endpoint in self._endpoints.items():
+            if endpoint.list_me:
+                applications[endpoint.application_name].append({
+                    'name': endpoint.model_name,
+                    'singular': endpoint.singular_model_name,
+                    'endpoint': url
+                })
+
+        return {
+            'endpoints': [k for k in self._endpoints.keys()],
+            'applications': [
+                {
+                    'name': k,
+                    'models': v
+                } for k, v in applications.items()
+            ],
+        }
+
+    def get_root_metadata(self):
+        """
+        Returns the (adapter-agnostic) part of the root metadata which only depends on the registry.
+        It is built once and rebuilt after the registry has changed.
+        """
+        root_metadata = self._root_metadata
+        if root_metadata is None:
+            root_metadata = self._root_metadata = self.build_root_metadata()
+        return root_metadata
+
     def registerViewSet(self, *args, **kwargs):
         super(EndpointRouter, self).register(*args, **kwargs)
 
@@ -1,15 +1,17 @@
+from weakref import WeakKeyDictionary
+
 from django.conf import settings as django_settings
-from django.utils.module_loading import import_string
 from django.utils.text import capfirst
 
-from inflector import Inflector
-
 from .app_settings import settings
 from .get_field_dict import get_field_dict  # NoQA
+from .inflectors import get_inflector
 
 
-inflector_language = import_string(settings.INFLECTOR_LANGUAGE)
-inflector = Inflector(inflector_language)
+inflector = get_inflector()
+
+ACTION_TYPES = ('custom', 'bulk', 'list')
+_viewset_actions = WeakKeyDictionary()
 
 
 def action_kwargs(icon_class, btn_class, text, func, kwargs):
@@ -27,6 +29,33 @@ def action_kwargs(icon_class, btn_class, text, func, kwargs):
     return kwargs
 
 
+def get_viewset_actions(viewset):
+    """
+    Returns the decorated actions of `viewset` indexed by action type.
+    Actions are only collected once per viewset class.
+    """
+    if not isinstance(viewset, type):
+        viewset = type(viewset)
+
+    try:
+        return _viewset_actions[viewset]
+    except KeyError:
+        pass
+
+    rv = {action_type: [] for action_type in ACTION_TYPES}
+    for action_name in dir(viewset):
+        try:
+            action = getattr(viewset, action_name)
+        except AttributeError:
+            continue
+        action_type = getattr(action, 'action_type', None)
+        if action_type in rv:
+            rv[action_type].append(action)
+
+    _viewset_actions[viewset] = rv
+    return rv
+
+
 def get_languages():
     if django_settings.USE_I18N:
         return [
@@ -0,0 +1,321 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.urls import get_script_prefix, set_script_prefix
+from django.utils import translation
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from rest_framework import routers, status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.generics import GenericAPIView, get_object_or_404
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import BasePermission
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .app_settings import settings
+from .querysets import get_values_transform
+from .renderers import MetadataJSONRenderer, PreEncodedMixin, encode_json, get_separators, pre_encoded
+
+
+class PreEncodedMetadataMixin(object):
+    """
+    Renders pre-encoded metadata (see `PRESERIALIZE_METADATA`) with
+    `MetadataJSONRenderer` instead of `JSONRenderer`.
+    """
+
+    def get_renderers(self):
+        renderers = super(PreEncodedMetadataMixin, self).get_renderers()
+        if not settings.PRESERIALIZE_METADATA:
+            return renderers
+        return [
+            MetadataJSONRenderer() if type(renderer) is JSONRenderer else renderer
+            for renderer in renderers
+        ]
+
+
+class MetadataETagMixin(PreEncodedMetadataMixin):
+    """
+    Sends an ETag along with OPTIONS responses and answers with a
+    `304 Not Modified` when the client already has the current metadata.
+    """
+
+    def options(self, request, *args, **kwargs):
+        if self.metadata_class is None:
+            return self.http_method_not_allowed(request, *args, **kwargs)
+
+        metadata = self.metadata_class()
+        if not hasattr(metadata, 'determine_metadata_and_etag'):
+            return super(MetadataETagMixin, self).options(request, *args, **kwargs)
+
+        data, etag = metadata.determine_metadata_and_etag(request, self)
+
+        response = None
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', None)
+        if if_none_match is not None:
+            etags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(if_none_match)]
+            if '*' in etags or etag in etags:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        if response is None:
+            response = Response(data, status=status.HTTP_200_OK, headers={'ETag': etag})
+
+        endpoint = getattr(self, 'endpoint', None)
+        if hasattr(endpoint, 'get_metadata_vary_headers'):
+            patch_vary_headers(response, endpoint.get_metadata_vary_headers())
+        return response
+
+
+class ValuesReadMixin(object):
+    """
+    Serves the `list` and `retrieve` actions from `queryset.values()`, skipping model instances,
+    when every field rendered by the serializer reads a column as is. Falls back to the regular path otherwise.
+    """
+
+    def get_values_transform(self, queryset):
+        """
+        Returns the columns to load and the function turning rows into their representation
+        (or `None` to use the regular path)
+        """
+        if isinstance(self.paginator, CursorPagination):
+            # cursors are built from instances
+            return None
+        return get_values_transform(self.get_serializer(), queryset.model)
+
+    def has_plain_object_permissions(self):
+        return all(
+            type(permission).has_object_permission is BasePermission.has_object_permission
+            for permission in self.get_permissions()
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        transform = self.get_values_transform(queryset)
+        if transform is None:
+            return super(ValuesReadMixin, self).list(request, *args, **kwargs)
+
+        columns, to_representation = transform
+        rows = queryset.prefetch_related(None).values(*columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response([to_representation(row) for row in page])
+        return Response([to_representation(row) for row in rows])
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        transform = self.get_values_transform(queryset)
+        if transform is None or type(self).get_object is not GenericAPIView.get_object or \
+                not self.has_plain_object_permissions():
+            # custom lookups and object permissions need the instance
+            return super(ValuesReadMixin, self).retrieve(request, *args, **kwargs)
+
+        columns, to_representation = transform
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            queryset.prefetch_related(None).values(*columns),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        return Response(to_representation(row))
+
+
+class ReadQuerysetMixin(object):
+    """
+    Uses `read_queryset` (eg: only loading the columns the serializer reads) for the read actions.
+    Other actions keep `queryset` so that saved instances are complete.
+    """
+
+    read_actions = ('list', 'retrieve')
+    read_queryset = None
+
+    def get_queryset(self):
+        # unless another mixin already picked a queryset for this request
+        if getattr(self, 'action', None) in self.read_actions and self.read_queryset is not None and \
+                self.queryset is type(self).queryset:
+            self.queryset = self.read_queryset
+        return super(ReadQuerysetMixin, self).get_queryset()
+
+
+class ListSerializerMixin(object):
+    """
+    Renders the `list` action with `list_serializer_class` (and `list_queryset`, when set).
+    """
+
+    list_serializer_class = None
+    list_queryset = None
+
+    def get_serializer_class(self):
+        if getattr(self, 'action', None) == 'list' and self.list_serializer_class is not None:
+            return self.list_serializer_class
+        return super(ListSerializerMixin, self).get_serializer_class()
+
+    def get_queryset(self):
+        # unless another mixin already picked a queryset for this request
+        if getattr(self, 'action', None) == 'list' and self.list_queryset is not None and \
+                self.queryset is type(self).queryset:
+            self.queryset = self.list_queryset
+        return super(ListSerializerMixin, self).get_queryset()
+
+
+class SparseFieldsetsMixin(object):
+    """
+    Lets clients choose the fields rendered by read actions with `?fields=a,b` and/or `?omit=c`.
+    When `narrow_queryset` is set, the queryset is narrowed to what the remaining fields need.
+    """
+
+    sparse_fields_param = 'fields'
+    sparse_omit_param = 'omit'
+    sparse_actions = ('list', 'retrieve')
+    narrow_queryset = False
+
+    def get_sparse_field_names(self):
+        """
+        Returns the names of the fields requested by the client (or `None` if all fields should be rendered)
+        """
+        if hasattr(self, '_sparse_field_names'):
+            return self._sparse_field_names
+
+        self._sparse_field_names = None
+        if getattr(self, 'action', None) not in self.sparse_actions or getattr(self, 'request', None) is None:
+            return None
+
+        requested = {}
+        for param in (self.sparse_fields_param, self.sparse_omit_param):
+            value = self.request.query_params.get(param, '')
+            names = [name.strip() for name in value.split(',') if name.strip()]
+            if len(names) > 0:
+                requested[param] = names
+        if len(requested) == 0:
+            return None
+
+        serializer_class = super(SparseFieldsetsMixin, self).get_serializer_class()
+        available = list(serializer_class(context=self.get_serializer_context()).fields.keys())
+
+        errors = {}
+        for param, names in requested.items():
+            unknown = [name for name in names if name not in available]
+            if len(unknown) > 0:
+                errors[param] = ['Unknown field(s): {}'.format(', '.join(unknown))]
+        if len(errors) > 0:
+            raise ValidationError(errors)
+
+        fields = requested.get(self.sparse_fields_param, available)
+        omit = requested.get(self.sparse_omit_param, [])
+        self._sparse_field_names = [name for name in available if name in fields and name not in omit]
+        return self._sparse_field_names
+
+    def get_serializer_class(self):
+        serializer_class = super(SparseFieldsetsMixin, self).get_serializer_class()
+        field_names = self.get_sparse_field_names()
+        if field_names is None:
+            return serializer_class
+
+        from .factories import sparse_serializer_factory
+        return sparse_serializer_factory(serializer_class, field_names)
+
+    def get_queryset(self):
+        if self.narrow_queryset and self.get_sparse_field_names() is not None:
+            from .factories import sparse_queryset_factory
+            # the cached queryset is copied (`.all()`) by GenericAPIView.get_queryset
+            self.queryset = sparse_queryset_factory(self.endpoint, self.get_serializer_class())
+        return super(SparseFieldsetsMixin, self).get_queryset()
+
+
+class APIRootView(MetadataETagMixin, routers.APIRootView):
+    # keeps the description of the browsable API and OPTIONS responses
+    __doc__ = routers.APIRootView.__doc__
+
+
+class BulkMetadataView(PreEncodedMetadataMixin, APIView):
+    """
+    Returns the metadata of several endpoints at once.
+
+    Endpoints are passed as a comma-separated list of urls (or `*` for all of
+    them) in the `endpoints` query parameter.
+    Endpoints the user is not allowed to access are left out of the response.
+    """
+
+    router = None
+    query_param = 'endpoints'
+
+    def get_urls(self, request):
+        values = request.query_params.getlist(self.query_param)
+        urls = [url.strip().strip('/') for value in values for url in value.split(',') if url.strip()]
+
+        if '*' in urls:
+            return list(self.router._endpoints.keys())
+
+        unknown = [url for url in urls if url not in self.router._endpoints]
+        if len(unknown) > 0:
+            raise ValidationError({self.query_param: ['Unknown endpoint(s): {}'.format(', '.join(unknown))]})
+
+        return urls
+
+    def get_endpoint_view(self, request, endpoint):
+        """
+        Instantiates the endpoint's viewset the way the router would for an
+        OPTIONS request on the endpoint's list route.
+        """
+        action_map = self.router.routes[0].mapping
+        view = endpoint.get_viewset()(request=request, format_kwarg=None, args=(), kwargs={}, headers={},
+                                      action='metadata', action_map=action_map)
+        for method, action in action_map.items():
+            if hasattr(view, action):
+                setattr(view, method, getattr(view, action))
+        return view
+
+    def determine_metadata(self, request, url):
+        view = self.get_endpoint_view(request, self.router._endpoints[url])
+        if view.metadata_class is None:
+            return None
+
+        try:
+            view.check_permissions(request)
+        except APIException:
+            return None
+
+        return view.metadata_class().determine_metadata(request, view)
+
+    def get(self, request, *args, **kwargs):
+        urls = self.get_urls(request)
+        workers = settings.BULK_METADATA_WORKERS
+
+        if workers is not None and workers > 1 and len(urls) > 1:
+            language = translation.get_language()
+            script_prefix = get_script_prefix()
+            # requests authenticate lazily and aren't thread-safe, authenticate before sharing this one
+            request.user
+            request.auth
+
+            def determine_metadata(url):
+                # translation and url prefixes are thread-local
+                set_script_prefix(script_prefix)
+                try:
+                    with translation.override(language):
+                        return self.determine_metadata(request, url)
+                finally:
+                    connections.close_all()
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(determine_metadata, urls))
+        else:
+            results = [self.determine_metadata(request, url) for url in urls]
+
+        metadata = {
+            url: endpoint_metadata
+            for url, endpoint_metadata in zip(urls, results)
+            if endpoint_metadata is not None
+        }
+        if settings.PRESERIALIZE_METADATA and \
+                all(isinstance(endpoint_metadata, PreEncodedMixin) for endpoint_metadata in metadata.values()):
+            return Response(pre_encoded(metadata, lambda: self.encode_metadata(metadata)))
+
+        return Response(metadata)
+
+    def encode_metadata(self, data):
+        item_separator, key_separator = get_separators()
+        return b'{' + item_separator.join(
+            encode_json(url) + key_separator + metadata.encoded
+            for url, metadata in data.items()
+        ) + b'}'
@@ -0,0 +1,53 @@
+from threading import RLock
+
+from django.test.signals import setting_changed
+
+from .app_settings import settings
+
+
+class WidgetResolver(object):
+    """
+    Resolves the widget of a field class from `WIDGET_MAPPING`, using the first class of its MRO
+    listed in the mapping. Results are cached per class.
+    """
+
+    def __init__(self):
+        self._widgets = {}
+        self._lock = RLock()
+
+    def resolve(self, field_class, default=None):
+        """
+        Returns the widget for `field_class` or `default` if no class in its MRO is mapped
+        """
+        try:
+            widget = self._widgets[field_class]
+        except KeyError:
+            widget = self._resolve(field_class)
+            with self._lock:
+                self._widgets[field_class] = widget
+
+        return default if widget is None else widget
+
+    def _resolve(self, field_class):
+        mapping = settings.WIDGET_MAPPING
+        for klass in field_class.__mro__:
+            if klass.__name__ in mapping:
+                return mapping[klass.__name__]
+        return None
+
+    def __call__(self, field_class):
+        return self.resolve(field_class, settings.DEFAULT_WIDGET)
+
+    def clear(self):
+        with self._lock:
+            self._widgets.clear()
+
+
+get_widget = WidgetResolver()
+
+
+def clear_widget_cache(**kwargs):
+    get_widget.clear()
+
+
+setting_changed.connect(clear_widget_cache)
@@ -3,8 +3,10 @@ from collections import defaultdict
 
 from django.conf import settings as django_settings
 from django.template.loader import render_to_string
-from django.utils.module_loading import import_string
 
+from rest_framework.settings import api_settings
+
+from drf_auto_endpoint.adapters import adapter_registry
 from export_app import settings
 
 
@@ -41,14 +43,19 @@ class BaseAdapter(object):
             otherwise use "works_with = 'serializer'"
         """
 
+    @classmethod
+    def prepare(cls):
+        default_mapping = cls.default_mapping
+        rv = defaultdict(lambda: default_mapping)
+        rv.update(cls.FIELD_TYPE_MAPPING)
+        rv.update(settings.FIELD_TYPE_MAPPING)
+        return {
+            'field_type_mapping': rv,
+        }
+
     @classproperty
     def field_type_mapping(cls):
-        default = cls.FIELD_TYPE_MAPPING
-        default.update(settings.FIELD_TYPE_MAPPING)
-        rv = defaultdict(lambda: cls.default_mapping)
-        for k, v in default.items():
-            rv[k] = v
-        return rv
+        return adapter_registry.get_data(cls)['field_type_mapping']
 
     @classproperty
     def default_mapping(cls):
@@ -165,8 +172,7 @@ class BaseMetadataAdapter(BaseAdapter):
         if isinstance(viewset, dict):
             output = viewset
         else:
-            MetadataClass = import_string(django_settings.REST_FRAMEWORK['DEFAULT_METADATA_CLASS'])
-            output = MetadataClass().determine_metadata(None, viewset)
+            output = api_settings.DEFAULT_METADATA_CLASS().determine_metadata(None, viewset)
 
         return output
 
@@ -196,12 +202,9 @@ class MetadataES6Adapter(BaseMetadataAdapter):
     index_template_name = 'export_app/ember_metadata_index.js'
 
     def walk_dir(self, base, ignore_index=False, prefix=''):
-        from inflector import Inflector
-        from django.utils.module_loading import import_string
-        from drf_auto_endpoint.app_settings import settings as auto_settings
+        from drf_auto_endpoint.inflectors import get_inflector
 
-        inflector_language = import_string(auto_settings.INFLECTOR_LANGUAGE)
-        inflector = Inflector(inflector_language)
+        inflector = get_inflector()
 
         imports = []
 
@@ -227,7 +230,7 @@ class MetadataES6Adapter(BaseMetadataAdapter):
         return imports
 
     def rebuild_index(self):
-        MetadataClass = import_string(django_settings.REST_FRAMEWORK['DEFAULT_METADATA_CLASS'])
+        MetadataClass = api_settings.DEFAULT_METADATA_CLASS
         context = {}
         directory = os.path.join(django_settings.BASE_DIR, settings.FRONT_APPLICATION_PATH,
                                  'app', 'data')
@@ -35,7 +35,7 @@ class BaseSerializerExporter(object):
         if endpoint is not None:
             model_name = endpoint.singular_model_name
             application_name = endpoint.application_name
-            viewset = endpoint.viewset
+            viewset = endpoint.get_viewset()
         else:
             for item in self.router.registry:
                 if item[0] == basename:
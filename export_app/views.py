@@ -1,7 +1,7 @@
 from django.http import Http404
 from django.views.generic import TemplateView
-from django.utils.module_loading import import_string
 
+from drf_auto_endpoint.adapters import adapter_registry
 from export_app import settings
 from export_app.base import SerializerExporterWithFields, ModelNotFoundException
 
@@ -14,7 +14,7 @@ class BaseModelView(SerializerExporterWithFields, TemplateView):
     def adapter_class(self):
         if self.endpoint is not None and getattr(self.endpoint, 'default_export_adapter', None) is not None:
             return self.endpoint.default_export_adapter
-        return import_string(settings.ADAPTER)
+        return adapter_registry.get_class(settings.ADAPTER)
 
     def get_endpoint_for_basename(self, *args, **kwargs):
         self.endpoint = super(BaseModelView, self).get_endpoint_for_basename(*args, **kwargs)
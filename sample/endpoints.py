@@ -65,6 +65,7 @@ class SecondFieldEndpoint(BaseNamedFieldsetsEndpoint):
 class RequestAwareCategoryEndpoint(Endpoint):
     model = Category
     serializer = RequestAwareCategorySerializer
+    metadata_vary_on = ('meta:USERNAME', )
 
     def get_url(self):
         return 'sample/request_aware_categories'
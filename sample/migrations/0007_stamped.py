@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sample', '0006_productchoice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Stamped',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
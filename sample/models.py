@@ -58,3 +58,9 @@ class ProductChoice(models.Model):
 
     name = models.CharField(max_length=255)
     products = models.ManyToManyField(Product, related_name='chosen')
+
+
+class Stamped(models.Model):
+
+    name = models.CharField(max_length=255)
+    modified = models.DateTimeField(auto_now=True)
@@ -1,7 +1,7 @@
 from rest_framework import viewsets, serializers
 from django_filters.rest_framework import FilterSet
 
-from ..models import Product, ProductChoice
+from ..models import Category, Product, ProductChoice
 
 
 class DummyProductSerializer(serializers.ModelSerializer):
@@ -57,3 +57,22 @@ class ProductFilterSet(FilterSet):
     class Meta:
         model = Product
         fields = ['category_id']
+
+
+class RelatedProductSerializer(serializers.ModelSerializer):
+
+    category_label = serializers.StringRelatedField(source='category')
+    category_name = serializers.CharField(source='category.name', read_only=True)
+
+    class Meta:
+        model = Product
+        fields = ('id', 'name', 'category', 'category_label', 'category_name', 'chosen')
+
+
+class NestedCategorySerializer(serializers.ModelSerializer):
+
+    products = RelatedProductSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ('id', 'name', 'products')
@@ -1,10 +1,16 @@
-from django.test import TestCase
+from copy import deepcopy
+from unittest import mock
+
+from django.test import TestCase, override_settings
 
 from drf_auto_endpoint.adapters import (
     AngularFormlyAdapter,
     BaseAdapter,
     EmberAdapter,
+    ReactJsonSchemaAdapter,
+    adapter_registry,
 )
+from export_app import adapters as export_adapters
 
 
 class AdapterTestCase(TestCase):
@@ -93,3 +99,130 @@ class AdapterTestCase(TestCase):
         }
 
         self.assertEqual(output, expected)
+
+    def test_adapters_do_not_mutate_their_input(self):
+        config = {
+            'fields': deepcopy(self._input['fields']) + [{
+                "key": "kind",
+                "type": "select",
+                "read_only": False,
+                "ui": {"label": "Kind", "placeholder": "Pick one"},
+                "validation": {"required": True},
+                "choices": [{"label": "A", "value": "a"}],
+                "translated": False,
+                "extra": {},
+            }],
+            'fieldsets': [
+                {'key': 'age', 'templateOptions': {'min': 12}},
+                {'type': 'fieldset', 'label': 'More', 'fields': [{'key': 'kind'}]},
+            ],
+            'needs': [{'app': 'my_app', 'singular': 'my_model', 'plural': 'my_models'}],
+        }
+        original = deepcopy(config)
+
+        for adapter_class in (BaseAdapter, AngularFormlyAdapter, EmberAdapter, ReactJsonSchemaAdapter):
+            adapter = adapter_class()
+            first = adapter(config)
+            self.assertEqual(config, original, adapter_class.__name__)
+            self.assertEqual(adapter(config), first, adapter_class.__name__)
+
+        root = {'endpoints': [], 'applications': [{'name': 'my_app', 'models': []}]}
+        EmberAdapter().render_root(root)
+        self.assertEqual(root['applications'][0]['name'], 'my_app')
+
+    def test_react_json_schema_adapter(self):
+        adapter = ReactJsonSchemaAdapter()
+        config = deepcopy(self._input)
+        config['fields'].append({
+            "key": "address",
+            "type": "text",
+            "read_only": True,
+            "ui": {"label": "Address"},
+            "validation": {"required": True},
+        })
+        config['fieldsets'] = [
+            {'key': 'age', 'ui': {'ui:autofocus': True}},
+            {'key': 'address', 'schema': {'type': 'object'}, 'fields': [{'key': 'age'}]},
+        ]
+
+        with mock.patch.object(adapter, 'get_key_index', wraps=adapter.get_key_index) as get_key_index:
+            output = adapter(config)
+            self.assertEqual(get_key_index.call_count, 1)
+
+        self.assertEqual(output['schema']['properties']['age'], {'title': 'Age', 'type': 'number', 'default': 20})
+        self.assertEqual(output['schema']['required'], ['address'])
+        self.assertEqual(output['schema']['properties']['address']['properties'], {
+            'age': {'title': 'Age', 'type': 'number', 'default': 20},
+        })
+        self.assertEqual(output['ui'], {
+            'age': {'ui:autofocus': True},
+            'address': {'ui:readonly': True, 'age': {}, 'ui:order': ['age']},
+            'ui:order': ['age', 'address'],
+        })
+        self.assertEqual(ReactJsonSchemaAdapter.adapt_field(config['fields'][0])['schema']['type'], 'number')
+
+    def test_react_json_schema_definitions(self):
+        class DefinitionsAdapter(ReactJsonSchemaAdapter):
+            use_definitions = True
+
+        status_choices = [{'label': 'Open', 'value': 'o'}, {'label': 'Closed', 'value': 'c'}]
+        config = {
+            'fields': [{
+                'key': key,
+                'type': 'select',
+                'read_only': False,
+                'ui': {'label': key.title()},
+                'validation': {'required': False},
+                'choices': choices,
+            } for key, choices in (
+                ('status', status_choices),
+                ('previous_status', status_choices),
+                ('size', [{'label': 'Small', 'value': 's'}]),
+            )],
+            'fieldsets': [{'key': 'status'}, {'key': 'previous_status'}, {'key': 'size'}],
+        }
+
+        output = DefinitionsAdapter()(config)
+        schema = output['schema']
+        self.assertEqual(len(schema['$defs']), 1)
+        name, definition = list(schema['$defs'].items())[0]
+        self.assertEqual(definition, {'enum': ['o', 'c'], 'enumNames': ['Open', 'Closed']})
+        for key in ('status', 'previous_status'):
+            self.assertEqual(schema['properties'][key], {
+                'title': key.title(), 'type': 'string', '$ref': '#/$defs/{}'.format(name),
+            })
+        self.assertEqual(schema['properties']['size']['enum'], ['s'])
+        self.assertIn('enum', output['fields'][0]['schema'])
+
+        self.assertNotIn('$defs', ReactJsonSchemaAdapter()(config)['schema'])
+
+
+class AdapterRegistryTestCase(TestCase):
+
+    def test_instances_are_shared(self):
+        adapter = adapter_registry.get('drf_auto_endpoint.adapters.EmberAdapter')
+        self.assertIsInstance(adapter, EmberAdapter)
+        self.assertIs(adapter, adapter_registry.get(EmberAdapter))
+
+    def test_configured_adapter(self):
+        self.assertIs(adapter_registry.get_class(), BaseAdapter)
+        with override_settings(DRF_AUTO_METADATA_ADAPTER='drf_auto_endpoint.adapters.EmberAdapter'):
+            self.assertIs(adapter_registry.get_class(), EmberAdapter)
+        self.assertIs(adapter_registry.get_class(), BaseAdapter)
+
+    def test_prepared_data(self):
+        data = adapter_registry.get_data(ReactJsonSchemaAdapter)
+        self.assertIs(data, adapter_registry.get_data(ReactJsonSchemaAdapter))
+        self.assertEqual(data['schema']['checkbox'], 'boolean')
+        self.assertEqual(data['schema']['unknown'], 'string')
+        self.assertIsNone(adapter_registry.get_data(BaseAdapter))
+
+    def test_export_field_type_mapping(self):
+        mapping = export_adapters.EmberAdapter.field_type_mapping
+        self.assertIs(mapping, export_adapters.EmberAdapter.field_type_mapping)
+        self.assertEqual(mapping['BooleanField'], 'boolean')
+        self.assertEqual(mapping['unknown'], 'string')
+
+        with override_settings(EXPORTER_FIELD_TYPE_MAPPING={'BooleanField': 'bool'}):
+            self.assertEqual(export_adapters.EmberAdapter.field_type_mapping['BooleanField'], 'bool')
+        self.assertEqual(export_adapters.EmberAdapter.FIELD_TYPE_MAPPING['BooleanField'], 'boolean')
@@ -1,4 +1,9 @@
+import json
+from unittest import mock
+
+from django.db import connection
 from django.test import override_settings, TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.core.management import call_command
 
 from rest_framework import status
@@ -8,7 +13,7 @@ from .factories import CategoryFactory, ProductFactory, HowItWorksFactory
 from .base import EndpointAPITestCase
 from .data import ProductFilterSet
 
-from ..models import HowItWorks, Product
+from ..models import Category, HowItWorks, Product, Stamped
 
 from urls import router
 
@@ -22,6 +27,7 @@ class ItRendersAPITest(APITestCase):
 
         response = self.client.options('/api/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['description'], 'The default basic root view for DefaultRouter')
 
         response = self.client.get('/api/sample/categories/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -186,6 +192,231 @@ class PaginationTestCase(ResponseDataMixin, APITestCase):
         self.assertEqual(len(self.get_response_data(response)['results']), page_size)
 
 
+class QuerysetOptimizationTestCase(APITestCase):
+
+    url = '/api/sample/categories/'
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, format='json')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_depend_on_rows(self):
+        for i in range(2):
+            ProductFactory(category=CategoryFactory())
+        expected = self.count_queries()
+
+        for i in range(5):
+            category = CategoryFactory()
+            for j in range(3):
+                ProductFactory(category=category)
+        self.assertEqual(self.count_queries(), expected)
+
+
+class ProjectedQuerysetTestCase(APITestCase):
+
+    def test_update_saves_fields_outside_serializer(self):
+        from drf_auto_endpoint.endpoints import Endpoint
+
+        instance = Stamped.objects.create(name='before')
+        modified = instance.modified
+        endpoint = Endpoint(model=Stamped, fields=('id', 'name'))
+
+        request = RequestFactory().put(
+            '/api/sample/stampeds/{}/'.format(instance.pk), {'name': 'after'}, content_type='application/json'
+        )
+        response = endpoint.get_viewset().as_view({'put': 'update'})(request, pk=instance.pk)
+        self.assertEqual(response.status_code, 200)
+
+        instance.refresh_from_db()
+        self.assertEqual(instance.name, 'after')
+        self.assertGreater(instance.modified, modified)
+
+
+class SparseFieldsetsTestCase(APITestCase):
+
+    url = '/api/sample/categories/'
+
+    @classmethod
+    def setUpTestData(cls):
+        ProductFactory(category=CategoryFactory())
+
+    def setUp(self):
+        from drf_auto_endpoint.endpoints import Endpoint
+
+        class SparseCategoryEndpoint(Endpoint):
+            model = Category
+            sparse_fieldsets = True
+
+        self.endpoint = SparseCategoryEndpoint()
+
+    def get_response(self, query, endpoint=None):
+        request = RequestFactory().get('{}?format=json&{}'.format(self.url, query))
+        return (endpoint or self.endpoint).get_viewset().as_view({'get': 'list'})(request)
+
+    def get_fields(self, query, endpoint=None):
+        response = self.get_response(query, endpoint)
+        self.assertEqual(response.status_code, 200)
+        return list(response.data['results'][0].keys())
+
+    def test_fields(self):
+        self.assertEqual(self.get_fields('fields=name,id'), ['id', 'name'])
+
+    def test_omit(self):
+        self.assertEqual(self.get_fields('omit=products,__str__'), ['id', 'name'])
+
+    def test_unknown_fields(self):
+        response = self.get_response('fields=id,nope')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nope', response.data['fields'][0])
+
+    def test_opt_in(self):
+        from drf_auto_endpoint.endpoints import Endpoint
+
+        self.assertEqual(self.get_fields('fields=nope', Endpoint(model=Category)),
+                         ['products', 'id', 'name', '__str__'])
+
+    def test_narrowed_queryset(self):
+        with CaptureQueriesContext(connection) as context:
+            self.get_fields('fields=id,name')
+        self.assertFalse(any('sample_product' in query['sql'] for query in context.captured_queries))
+
+    def test_sparse_serializer_is_cached(self):
+        from drf_auto_endpoint.factories import sparse_queryset_factory, sparse_serializer_factory
+
+        serializer = self.endpoint.get_serializer()
+        trimmed = sparse_serializer_factory(serializer, ['id', 'name'])
+        self.assertIs(sparse_serializer_factory(serializer, ['id', 'name']), trimmed)
+        self.assertEqual(list(trimmed().fields.keys()), ['id', 'name'])
+
+        queryset = sparse_queryset_factory(self.endpoint, trimmed)
+        self.assertIs(sparse_queryset_factory(self.endpoint, trimmed), queryset)
+        with mock.patch('drf_auto_endpoint.factories.queryset_factory') as queryset_factory:
+            self.get_fields('fields=id,name')
+            self.get_fields('fields=name,id')
+            queryset_factory.assert_not_called()
+
+
+class ListSerializerTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = CategoryFactory()
+        ProductFactory(category=cls.category)
+
+    def setUp(self):
+        from drf_auto_endpoint.endpoints import Endpoint
+
+        class ListCategoryEndpoint(Endpoint):
+            model = Category
+            list_serializer = True
+            sparse_fieldsets = True
+
+        self.endpoint = ListCategoryEndpoint()
+        self.factory = RequestFactory()
+
+    def test_list(self):
+        request = self.factory.get('/api/sample/categories/?format=json')
+        with CaptureQueriesContext(connection) as context:
+            response = self.endpoint.get_viewset().as_view({'get': 'list'})(request)
+        self.assertEqual(list(response.data['results'][0].keys()), ['id', '__str__'])
+        self.assertFalse(any('sample_product' in query['sql'] for query in context.captured_queries))
+
+    def test_retrieve(self):
+        request = self.factory.get('/api/sample/categories/{}/?format=json'.format(self.category.pk))
+        response = self.endpoint.get_viewset().as_view({'get': 'retrieve'})(request, pk=self.category.pk)
+        self.assertEqual(sorted(response.data.keys()), ['__str__', 'id', 'name', 'products'])
+
+    def test_sparse_list(self):
+        request = self.factory.get('/api/sample/categories/?format=json&fields=id')
+        response = self.endpoint.get_viewset().as_view({'get': 'list'})(request)
+        self.assertEqual(list(response.data['results'][0].keys()), ['id'])
+
+    def test_base_viewset_with_mixin(self):
+        from rest_framework.viewsets import ModelViewSet
+        from drf_auto_endpoint.endpoints import Endpoint
+        from drf_auto_endpoint.views import ListSerializerMixin
+
+        class BaseViewSet(ListSerializerMixin, ModelViewSet):
+            pass
+
+        endpoint = Endpoint(model=Category, list_serializer=True, base_viewset=BaseViewSet)
+        request = self.factory.get('/api/sample/categories/?format=json')
+        response = endpoint.get_viewset().as_view({'get': 'list'})(request)
+        self.assertEqual(list(response.data['results'][0].keys()), ['id', '__str__'])
+
+
+class ValuesReadTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = ProductFactory(category=CategoryFactory())
+        ProductFactory(category=CategoryFactory(), product_type='r')
+
+    def get_endpoint(self, **kwargs):
+        from drf_auto_endpoint.endpoints import Endpoint
+
+        attrs = {'model': Product, 'read_only': True, 'fields': ('id', 'name', 'category', 'product_type')}
+        attrs.update(kwargs)
+        return type('ProductEndpoint', (Endpoint, ), attrs)()
+
+    def get_content(self, endpoint, actions, url, **kwargs):
+        request = RequestFactory().get(url)
+        response = endpoint.get_viewset().as_view(actions)(request, **kwargs)
+        response.render()
+        return response.status_code, response.content
+
+    def assertSameContent(self, actions, url, **kwargs):
+        # the second set of fields needs instances
+        for fields in (('id', 'name', 'category', 'product_type'), ('id', 'name', '__str__')):
+            expected = self.get_content(self.get_endpoint(fields=fields), actions, url, **kwargs)
+            content = self.get_content(self.get_endpoint(fields=fields, read_from_values=True), actions, url, **kwargs)
+            self.assertEqual(content, expected)
+
+    def test_list(self):
+        self.assertSameContent({'get': 'list'}, '/api/sample/products/?format=json')
+
+    def test_retrieve(self):
+        url = '/api/sample/products/{}/?format=json'.format(self.product.pk)
+        self.assertSameContent({'get': 'retrieve'}, url, pk=self.product.pk)
+
+    def test_retrieve_not_found(self):
+        status_code, content = self.get_content(
+            self.get_endpoint(read_from_values=True), {'get': 'retrieve'}, '/api/sample/products/0/?format=json',
+            pk=0
+        )
+        self.assertEqual(status_code, 404)
+
+    def test_retrieve_custom_get_object(self):
+        from rest_framework.viewsets import ReadOnlyModelViewSet
+
+        class ByNameViewSet(ReadOnlyModelViewSet):
+
+            def get_object(self):
+                return self.get_queryset().get(name=self.kwargs['pk'])
+
+        endpoint = self.get_endpoint(read_from_values=True, base_readonly_viewset=ByNameViewSet)
+        status_code, content = self.get_content(
+            endpoint, {'get': 'retrieve'}, '/api/sample/products/x/?format=json', pk=self.product.name
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(json.loads(content)['id'], self.product.pk)
+
+    def test_values_transform(self):
+        from drf_auto_endpoint.querysets import get_values_transform
+
+        columns, to_representation = get_values_transform(self.get_endpoint().get_serializer()(), Product)
+        self.assertEqual(columns, ['id', 'name', 'category_id', 'product_type'])
+        self.assertEqual(
+            to_representation({'id': 1, 'name': 'name', 'category_id': 2, 'product_type': 's'}),
+            {'id': 1, 'name': 'name', 'category': 2, 'product_type': 's'}
+        )
+
+        serializer = self.get_endpoint(fields=('id', '__str__')).get_serializer()()
+        self.assertIsNone(get_values_transform(serializer, Product))
+
+
 class FilterTestCase(APITestCase):
 
     @classmethod
@@ -252,3 +483,60 @@ class RequestAwareEndpointTestCase(ResponseDataMixin, APITestCase):
 
         response = self.client.options(self.url, USERNAME='Pirx')
         self.assertIn('name', (field['key'] for field in self.get_response_data(response)))
+
+
+class BulkMetadataTestCase(ResponseDataMixin, APITestCase):
+    url = '/api/_metadata/'
+
+    def test_bulk_metadata(self):
+        endpoints = ['sample/categories', 'sample/howitworks']
+        response = self.client.get(self.url, {'endpoints': ','.join(endpoints)})
+        data = self.get_response_data(response)
+
+        self.assertEqual(list(data.keys()), endpoints)
+        for endpoint in endpoints:
+            expected = self.get_response_data(self.client.options('/api/{}/'.format(endpoint)))
+            self.assertEqual(data[endpoint], expected)
+
+    def test_all_endpoints(self):
+        data = self.get_response_data(self.client.get(self.url, {'endpoints': '*'}))
+        self.assertEqual(set(data.keys()), set(router._endpoints.keys()))
+
+    def test_unknown_endpoint(self):
+        response = self.client.get(self.url, {'endpoints': 'sample/categories,sample/unknown'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(DRF_AUTO_BULK_METADATA_WORKERS=4)
+    def test_concurrent_bulk_metadata(self):
+        data = self.get_response_data(self.client.get(self.url, {'endpoints': '*'}))
+        self.assertEqual(set(data.keys()), set(router._endpoints.keys()))
+        self.assertEqual(
+            data['sample/categories'],
+            self.get_response_data(self.client.options('/api/sample/categories/'))
+        )
+
+    @override_settings(DRF_AUTO_BULK_METADATA_WORKERS=4)
+    def test_concurrent_bulk_metadata_authenticates_once(self):
+        from threading import get_ident
+        from rest_framework.request import Request
+        from drf_auto_endpoint.views import BulkMetadataView
+
+        authenticate = Request._authenticate
+        determine_metadata = BulkMetadataView.determine_metadata
+        threads = []
+
+        def _authenticate(request):
+            threads.append(get_ident())
+            return authenticate(request)
+
+        def check_user(view, request, url):
+            # as a permission class would
+            request.user
+            return determine_metadata(view, request, url)
+
+        # as if the view didn't authenticate before handling the request
+        with mock.patch.object(BulkMetadataView, 'perform_authentication'), \
+                mock.patch.object(BulkMetadataView, 'determine_metadata', check_user), \
+                mock.patch.object(Request, '_authenticate', _authenticate):
+            self.get_response_data(self.client.get(self.url, {'endpoints': '*'}))
+        self.assertEqual(threads, [get_ident()])
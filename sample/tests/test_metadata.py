@@ -1,7 +1,19 @@
-from django.test import TestCase
+from unittest import mock
 
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import set_script_prefix
+from django.utils import translation
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from drf_auto_endpoint.cache import metadata_cache, invalidate_metadata_cache
 from drf_auto_endpoint.endpoints import Endpoint
+from drf_auto_endpoint import renderers
 from drf_auto_endpoint.metadata import AutoMetadataMixin
+from drf_auto_endpoint.router import router
 
 from sample.endpoints import ProductEndpoint, HowItWorksEndpoint, FirstFieldEndpoint, SecondFieldEndpoint
 
@@ -85,6 +97,57 @@ class TestMetadata(TestCase):
         custom_actions = endpoint.get_custom_actions()
         self.assertGreater(len(custom_actions), 0)
 
+    def test_actions_are_collected_once(self):
+        endpoint = router.get_endpoint('sample/howitworks')
+        expected = (endpoint.get_custom_actions(), endpoint.get_bulk_actions())
+
+        with mock.patch('drf_auto_endpoint.endpoints.reverse') as reverse:
+            custom_actions = endpoint.get_custom_actions()
+            bulk_actions = endpoint.get_bulk_actions()
+            reverse.assert_not_called()
+        self.assertEqual((custom_actions, bulk_actions), expected)
+        self.assertEqual(custom_actions[0]['url'], '/api/sample/howitworks/:id/add/')
+
+        # entries are copies
+        custom_actions[0]['url'] = 'changed'
+        self.assertEqual(endpoint.get_custom_actions(), expected[0])
+
+        set_script_prefix('/prefix/')
+        try:
+            self.assertEqual(endpoint.get_custom_actions()[0]['url'], '/prefix/api/sample/howitworks/:id/add/')
+        finally:
+            set_script_prefix('/')
+
+        # urls are reversed again in other languages (eg: with i18n_patterns)
+        with translation.override('fr'), mock.patch('drf_auto_endpoint.endpoints.reverse') as reverse:
+            reverse.return_value = '/fr/api/sample/howitworks/:id/add/'
+            self.assertEqual(endpoint.get_custom_actions()[0]['url'], reverse.return_value)
+
+    def test_wizard_metadata_depends_on_adapter(self):
+        endpoint = router.get_endpoint('sample/howitworks')
+        wizard = endpoint.get_custom_actions()[0]
+        self.assertEqual(wizard['type'], 'wizard')
+        self.assertEqual([field['key'] for field in wizard['params']['fields']], ['amount'])
+
+        with override_settings(DRF_AUTO_METADATA_ADAPTER='drf_auto_endpoint.adapters.EmberAdapter'):
+            wizard = endpoint.get_custom_actions()[0]
+            self.assertEqual(wizard['type'], 'closureMethod')
+            self.assertEqual(wizard['method'], '_wizard')
+            self.assertEqual([field['name'] for field in wizard['params']['fields']], ['amount'])
+
+            response = self.client.options('/api/sample/howitworks/')
+            self.assertEqual(response.json()['custom_actions'][0]['type'], 'closureMethod')
+
+        self.assertEqual(endpoint.get_custom_actions()[0]['type'], 'wizard')
+
+    def test_wizard_metadata_is_computed_once_per_adapter(self):
+        endpoint = router.get_endpoint('sample/howitworks')
+        expected = endpoint.get_custom_actions()
+
+        with mock.patch('drf_auto_endpoint.decorators.get_field_dict') as get_field_dict:
+            self.assertEqual(endpoint.get_custom_actions(), expected)
+            get_field_dict.assert_not_called()
+
     def test_named_fieldsets(self):
         endpoint = FirstFieldEndpoint()
         fieldsets = endpoint.get_fieldsets()
@@ -114,3 +177,194 @@ class TestMetadata(TestCase):
         for i in range(2):
             # There are 2 fields in DummyChoiesSerializer and both should have choices
             self.assertIn('choices', metadata[i])
+
+
+@override_settings(DRF_AUTO_METADATA_CACHE_SIZE=2)
+class TestMetadataCache(APITestCase):
+
+    def setUp(self):
+        metadata_cache.clear()
+
+    def test_hits_and_misses(self):
+        first = self.client.options('/api/sample/categories/').json()
+        self.assertEqual(metadata_cache.info().misses, 1)
+        self.assertEqual(metadata_cache.info().hits, 0)
+
+        second = self.client.options('/api/sample/categories/').json()
+        self.assertEqual(metadata_cache.info().hits, 1)
+        self.assertEqual(first, second)
+
+    def test_bounded_size(self):
+        for url in ('/api/sample/categories/', '/api/sample/products/', '/api/sample/howitworks/'):
+            self.client.options(url)
+        self.assertEqual(metadata_cache.info().currsize, 2)
+
+    def test_undeclared_request_aware_endpoint_is_not_cached(self):
+        endpoint = router.get_endpoint('sample/request_aware_categories')
+        with mock.patch.object(endpoint, 'metadata_vary_on', None):
+            self.client.options('/api/sample/request_aware_categories/')
+        self.assertEqual(metadata_cache.info().currsize, 0)
+
+    def test_request_aware_endpoint_is_cached_per_variant(self):
+        url = '/api/sample/request_aware_categories/'
+        joe = self.client.options(url, USERNAME='Joe').json()
+        pirx = self.client.options(url, USERNAME='Pirx').json()
+        self.assertEqual(metadata_cache.info().currsize, 2)
+        self.assertNotEqual(joe, pirx)
+
+        self.assertEqual(self.client.options(url, USERNAME='Joe').json(), joe)
+        self.assertEqual(self.client.options(url, USERNAME='Pirx').json(), pirx)
+        self.assertEqual(metadata_cache.info().hits, 2)
+
+    def test_vary_key(self):
+        endpoint = router.get_endpoint('sample/categories')
+        request = APIRequestFactory().options('/', HTTP_X_TENANT='acme')
+        request.user = AnonymousUser()
+        with mock.patch.object(endpoint, 'metadata_vary_on', ('user', 'groups', 'header:X-Tenant')):
+            self.assertEqual(endpoint.get_metadata_vary_key(request), (None, (), 'acme'))
+            self.assertEqual(endpoint.get_metadata_vary_headers(), ['X-Tenant'])
+        with mock.patch.object(endpoint, 'metadata_vary_on', ('unknown', )):
+            with self.assertRaises(ImproperlyConfigured):
+                endpoint.get_metadata_vary_key(request)
+
+    def test_invalidation(self):
+        self.client.options('/api/sample/categories/')
+        self.assertEqual(metadata_cache.info().currsize, 1)
+
+        router.override_registry_entry(router.get_endpoint('sample/categories'))
+        self.assertEqual(metadata_cache.info().currsize, 0)
+
+        self.client.options('/api/sample/categories/')
+        with self.settings(DRF_AUTO_METADATA_ADAPTER='drf_auto_endpoint.adapters.EmberAdapter'):
+            self.assertEqual(metadata_cache.info().currsize, 0)
+            self.client.options('/api/sample/categories/')
+            self.assertEqual(metadata_cache.info().currsize, 1)
+
+        invalidate_metadata_cache()
+        self.assertEqual(metadata_cache.info().currsize, 0)
+
+    def test_disabled_by_default(self):
+        with self.settings(DRF_AUTO_METADATA_CACHE_SIZE=0):
+            self.client.options('/api/sample/categories/')
+            self.assertEqual(metadata_cache.info().currsize, 0)
+
+
+class TestMetadataETag(APITestCase):
+
+    url = '/api/sample/categories/'
+
+    def test_etag_is_sent(self):
+        response = self.client.options(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        self.assertEqual(response['ETag'], self.client.options(self.url)['ETag'])
+
+    def test_not_modified(self):
+        etag = self.client.options(self.url)['ETag']
+
+        response = self.client.options(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.options(self.url, HTTP_IF_NONE_MATCH='"outdated"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_root_etag(self):
+        etag = self.client.options('/api/')['ETag']
+        response = self.client.options('/api/', HTTP_IF_NONE_MATCH='W/{}'.format(etag))
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_adapter(self):
+        etag = self.client.options(self.url)['ETag']
+        with self.settings(DRF_AUTO_METADATA_ADAPTER='drf_auto_endpoint.adapters.EmberAdapter'):
+            self.assertNotEqual(etag, self.client.options(self.url)['ETag'])
+
+    @override_settings(DRF_AUTO_METADATA_CACHE_SIZE=10)
+    def test_memoized_etag_skips_computation(self):
+        etag = self.client.options(self.url)['ETag']
+
+        with mock.patch.object(AutoMetadataMixin, 'determine_adapted_metadata') as determine:
+            response = self.client.options(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            determine.assert_not_called()
+
+    def test_vary_header(self):
+        endpoint = router.get_endpoint('sample/categories')
+        with mock.patch.object(endpoint, 'metadata_vary_on', ('header:X-Tenant', )):
+            response = self.client.options(self.url)
+        self.assertIn('X-Tenant', response['Vary'])
+
+    def test_pinned_adapter(self):
+        endpoint = router.get_endpoint('sample/categories')
+        with mock.patch.object(endpoint, 'metadata_adapter', 'drf_auto_endpoint.adapters.EmberAdapter'):
+            metadata = self.client.options(self.url).json()
+        self.assertIn('needs', metadata)
+        self.assertIsInstance(self.client.options(self.url).json(), list)
+
+
+@override_settings(DRF_AUTO_METADATA_CACHE_SIZE=10)
+class TestPreEncodedMetadata(APITestCase):
+
+    urls = ('/api/', '/api/sample/categories/', '/api/sample/products/',
+            '/api/_metadata/?endpoints=sample/categories,sample/products')
+
+    def setUp(self):
+        metadata_cache.clear()
+
+    def assertSameContent(self):
+        for url in self.urls:
+            method = self.client.get if '_metadata' in url else self.client.options
+            expected = method(url).content
+            with self.settings(DRF_AUTO_PRESERIALIZE_METADATA=True):
+                response = method(url)
+                self.assertEqual(response.content, expected)
+                self.assertIsInstance(response.data, renderers.PreEncodedMixin)
+
+    def test_same_content_with_orjson(self):
+        if renderers.orjson is None:
+            self.skipTest('orjson is not installed')
+        self.assertSameContent()
+
+    def test_same_content_without_orjson(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertSameContent()
+
+    def test_same_floats_as_json_renderer(self):
+        renderer = JSONRenderer()
+        for value in (0.1, 1e15, 1e16, 1e20, 1e-7, -2.5e-10):
+            data = {'value': value, 'values': [value, {value: 1}]}
+            self.assertEqual(renderers.encode_json(data), renderer.render(data))
+
+    def test_non_finite_floats(self):
+        renderer = JSONRenderer()
+        renderer.strict = False
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.assertRaises(ValueError):
+                renderers.encode_json({'value': value})
+            with override_settings(REST_FRAMEWORK={'STRICT_JSON': False}):
+                self.assertEqual(renderers.encode_json([value]), renderer.render([value]))
+
+    def test_same_content_with_merged_metadata(self):
+        with self.settings(DRF_AUTO_METADATA_ADAPTER='drf_auto_endpoint.adapters.EmberAdapter'):
+            self.assertSameContent()
+
+    def test_same_content_with_non_default_json_settings(self):
+        with self.settings(REST_FRAMEWORK={'UNICODE_JSON': False, 'COMPACT_JSON': False}):
+            self.assertSameContent()
+
+    def test_encoding_is_memoized(self):
+        with self.settings(DRF_AUTO_PRESERIALIZE_METADATA=True):
+            self.client.options('/api/sample/categories/')
+            with mock.patch('drf_auto_endpoint.metadata.encode_json', wraps=renderers.encode_json) as encode:
+                self.client.options('/api/sample/categories/')
+                encode.assert_not_called()
+
+    def test_encoding_is_memoized_when_merged(self):
+        with self.settings(DRF_AUTO_PRESERIALIZE_METADATA=True,
+                           DRF_AUTO_METADATA_ADAPTER='drf_auto_endpoint.adapters.EmberAdapter'):
+            self.client.options('/api/sample/categories/')
+            with mock.patch('drf_auto_endpoint.metadata.encode_json', wraps=renderers.encode_json) as encode:
+                self.client.options('/api/sample/categories/')
+                # only the (small) base metadata gets encoded again
+                self.assertEqual(encode.call_count, 1)
@@ -1,8 +1,19 @@
-from django.test import TestCase, override_settings
+import json
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db.models import Prefetch
+from django.test import RequestFactory, TestCase, override_settings
 
 from rest_framework.permissions import AllowAny
 from rest_framework import filters, pagination
-from rest_framework.serializers import CharField, IntegerField
+from rest_framework.serializers import CharField, DecimalField, IntegerField, SerializerMethodField
 from rest_framework.viewsets import ModelViewSet
 try:
     from django_filters.rest_framework import DjangoFilterBackend
@@ -10,15 +21,21 @@ except ImportError:
     # Older versions of DRF and django_filters
     from rest_framework.filters import DjangoFilterBackend
 
-from ..models import Product, Category, PRODUCT_TYPES
+from ..endpoints import FirstFieldEndpoint, HowItWorksEndpoint, SecondFieldEndpoint
+from ..models import NamedFieldsets, Product, Category, PRODUCT_TYPES
 
 from .data import (AllFieldDummyProductSerializer, DummyProductSerializer, DummyProductViewSet,
-                   DummyProductSerializerWithField)
+                   DummyProductSerializerWithField, NestedCategorySerializer, RelatedProductSerializer)
 
 from drf_auto_endpoint.endpoints import Endpoint
-from drf_auto_endpoint.router import router
+from drf_auto_endpoint.fieldsets import FieldsetsStore
+from drf_auto_endpoint.inflectors import get_inflector
+from drf_auto_endpoint.profiling import registration_profiler
+from drf_auto_endpoint.querysets import get_only_fields, get_related_lookups, get_str_attributes, get_str_relations
+from drf_auto_endpoint.router import EndpointRouter, router
 from drf_auto_endpoint import utils
 from drf_auto_endpoint.app_settings import settings
+from drf_auto_endpoint.widgets import get_widget
 
 
 class EndpointTestCase(TestCase):
@@ -81,6 +98,29 @@ class EndpointTestCase(TestCase):
                 self.assertIn('choices', field_dict)
                 self.assertEqual(len(field_dict['choices']), len(PRODUCT_TYPES))
 
+    def test_metadata_context(self):
+        endpoint = self.endpoint
+        request = object()
+
+        with mock.patch.object(endpoint, 'get_serializer_instance', wraps=endpoint.get_serializer_instance) as get:
+            with endpoint.metadata_context(request):
+                fields = endpoint.get_fields(request)
+                endpoint.get_fieldsets(request)
+                endpoint.get_list_display(request)
+                endpoint.get_needs(request)
+                name = [field for field in fields if field['key'] == 'name'][0]
+                self.assertIs(endpoint._get_field_dict('name', request=request), name)
+            self.assertEqual(get.call_count, 1)
+
+            # nothing is shared outside of the context or for another request
+            with endpoint.metadata_context(request):
+                endpoint.get_fields(None)
+                endpoint.get_fields(None)
+            endpoint.get_fields(request)
+            self.assertEqual(get.call_count, 7)
+
+        self.assertEqual(endpoint.get_fields(request), fields)
+
     def test_model(self):
         self.assertEqual(self.endpoint.model, Product)
 
@@ -100,6 +140,18 @@ class EndpointTestCase(TestCase):
 
         self.assertEqual(serializer.__name__, 'ProductSerializer')
 
+    def test_serializer_factory_shares_identical_serializers(self):
+        self.assertIs(FirstFieldEndpoint().get_serializer(), SecondFieldEndpoint().get_serializer())
+        self.assertIsNot(
+            Endpoint(model=Product, fields=('id', 'name')).get_serializer(),
+            Endpoint(model=Product, fields=('id', 'category')).get_serializer()
+        )
+        self.assertIsNot(
+            Endpoint(model=Product, fields=('id', 'name')).get_serializer(),
+            Endpoint(model=Product, fields=('id', 'name'), base_serializer=DummyProductSerializerWithField)
+            .get_serializer()
+        )
+
     def test_factory_serializer_dont_override_fields(self):
         endpoint = Endpoint(model=Product, base_serializer=DummyProductSerializerWithField, fields=('id', 'name'))
         serializer = endpoint.get_serializer()
@@ -237,6 +289,291 @@ class RouterTestCase(TestCase):
         endpoint = router.get_endpoint('bogus')
         self.assertTrue(isinstance(endpoint, Endpoint))
 
+    def test_root_metadata_is_precomputed(self):
+        root_metadata = router.get_root_metadata()
+        self.assertIs(root_metadata, router.get_root_metadata())
+        self.assertIn('sample/categories', root_metadata['endpoints'])
+        sample = [app for app in root_metadata['applications'] if app['name'] == 'sample'][0]
+        self.assertIn({'name': 'categories', 'singular': 'category', 'endpoint': 'sample/categories'},
+                      sample['models'])
+
+    def test_root_metadata_is_refreshed(self):
+        root_metadata = router.get_root_metadata()
+
+        router.register(Product, url='other_bogus')
+        self.assertIsNot(root_metadata, router.get_root_metadata())
+        self.assertIn('other_bogus', router.get_root_metadata()['endpoints'])
+
+        root_metadata = router.get_root_metadata()
+        router.override_registry_entry(router.get_endpoint('sample/categories'))
+        self.assertIsNot(root_metadata, router.get_root_metadata())
+
+
+@override_settings(DRF_AUTO_LAZY_ENDPOINTS=True)
+class LazyEndpointsTestCase(TestCase):
+
+    def get_url_names(self, router):
+        return [url.name for url in router.get_urls()]
+
+    def test_registration_builds_nothing(self):
+        lazy_router = EndpointRouter()
+        endpoint = HowItWorksEndpoint()
+        lazy_router.register(endpoint=endpoint)
+        url_names = self.get_url_names(lazy_router)
+
+        self.assertIsNone(endpoint.serializer)
+        self.assertIsNone(endpoint.viewset)
+
+        with override_settings(DRF_AUTO_LAZY_ENDPOINTS=False):
+            eager_router = EndpointRouter()
+            eager_router.register(endpoint=HowItWorksEndpoint())
+        self.assertEqual(url_names, self.get_url_names(eager_router))
+
+    def test_first_dispatch_builds_viewset(self):
+        lazy_router = EndpointRouter()
+        endpoint = Endpoint(model=Category)
+        lazy_router.register(endpoint=endpoint)
+        view = [url for url in lazy_router.get_urls() if url.name == 'sample/categories-list'][0].callback
+        self.assertIsNone(endpoint.viewset)
+
+        response = view(RequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(endpoint.viewset)
+        self.assertIs(view.cls.serializer_class, endpoint.get_serializer())
+
+    def test_schema_generation(self):
+        from rest_framework.schemas.generators import EndpointEnumerator
+
+        def get_paths(router):
+            return [(path, method) for path, method, callback in EndpointEnumerator(router.urls).get_api_endpoints()]
+
+        lazy_router = EndpointRouter()
+        lazy_router.register(endpoint=HowItWorksEndpoint())
+        with override_settings(DRF_AUTO_LAZY_ENDPOINTS=False):
+            eager_router = EndpointRouter()
+            eager_router.register(endpoint=HowItWorksEndpoint())
+
+        paths = get_paths(lazy_router)
+        self.assertIn(('/sample/howitworks/', 'GET'), paths)
+        self.assertEqual(paths, get_paths(eager_router))
+
+
+def format_named_fieldsets(instance):
+    return instance.first_field
+
+
+def describe_named_fieldsets(instance):
+    return instance.first_field
+
+
+class QuerysetOptimizationTestCase(TestCase):
+
+    def get_lookups(self, queryset):
+        return (
+            list(queryset.query.select_related or {}),
+            [
+                lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+                for lookup in queryset._prefetch_related_lookups
+            ]
+        )
+
+    def test_generated_endpoint(self):
+        queryset = Endpoint(model=Category).get_viewset().queryset
+        self.assertEqual(self.get_lookups(queryset), ([], ['products']))
+        self.assertEqual(queryset._prefetch_related_lookups[0].queryset.query.deferred_loading,
+                         ({'id', 'category'}, False))
+
+        # foreign keys rendered as primary keys don't need the related object
+        queryset = Endpoint(model=Product).get_viewset().queryset
+        self.assertEqual(self.get_lookups(queryset), ([], ['chosen']))
+
+    def test_related_lookups(self):
+        self.assertEqual(get_related_lookups(RelatedProductSerializer, Product)[0], ['category'])
+        select_related, prefetch_related = get_related_lookups(NestedCategorySerializer, Category)
+        self.assertEqual(select_related, [])
+        self.assertEqual(prefetch_related, ['products', 'products__category', 'products__chosen'])
+
+    def test_str_relations(self):
+        class ProductWithCategory(object):
+            _meta = Product._meta
+
+            def __str__(self):
+                return '{} ({})'.format(self.name, self.category.name)
+
+        self.assertEqual(get_str_relations(ProductWithCategory), ('category', ))
+        self.assertEqual(get_str_relations(Product), ())
+
+    def test_only_fields(self):
+        viewset = Endpoint(model=NamedFieldsets, fields=('id', 'first_field')).get_viewset()
+        self.assertEqual(viewset.read_queryset.query.deferred_loading, ({'id', 'first_field'}, False))
+        # writes load complete instances
+        self.assertEqual(viewset.queryset.query.deferred_loading, (frozenset(), True))
+
+        # Category.__str__ only reads name
+        self.assertEqual(get_only_fields(Endpoint(model=Category).get_serializer(), Category), ['id', 'name'])
+        self.assertEqual(get_only_fields(RelatedProductSerializer, Product), ['id', 'name', 'category'])
+
+    def test_only_fields_fallback(self):
+        class MethodSerializer(DummyProductSerializer):
+            label = SerializerMethodField()
+
+            class Meta(DummyProductSerializer.Meta):
+                fields = ('id', 'name', 'label')
+
+            def get_label(self, obj):
+                return obj.name
+
+        self.assertIsNone(get_only_fields(MethodSerializer, Product))
+
+        class OpaqueStr(object):
+            _meta = NamedFieldsets._meta
+
+            def __str__(self):
+                return format_named_fieldsets(self)
+
+        self.assertIsNone(get_str_attributes(OpaqueStr))
+        self.assertEqual(get_str_attributes(NamedFieldsets), (('pk', ), ))
+
+        class SuperStr(NamedFieldsets):
+            class Meta:
+                proxy = True
+                app_label = 'sample'
+
+            def __str__(self):
+                return '* {}'.format(super().__str__())
+
+        self.assertIsNone(get_str_attributes(SuperStr))
+        serializer = Endpoint(model=NamedFieldsets, fields=('id', '__str__')).get_serializer()
+        self.assertIsNone(get_only_fields(serializer, SuperStr))
+
+        class DescribedStr(object):
+            _meta = NamedFieldsets._meta
+            __str__ = describe_named_fieldsets
+
+        self.assertEqual(get_str_attributes(DescribedStr), (('first_field', ), ))
+        self.assertEqual(get_only_fields(serializer, DescribedStr), ['id', 'first_field'])
+
+        with mock.patch('drf_auto_endpoint.querysets.get_str_attributes', return_value=()):
+            self.assertIsNone(get_only_fields(serializer, NamedFieldsets))
+
+        queryset = Endpoint(model=Product, serializer=MethodSerializer).get_viewset().read_queryset
+        self.assertEqual(queryset.query.deferred_loading, (frozenset(), True))
+
+        class OnlyEndpoint(Endpoint):
+            model = Product
+            serializer = MethodSerializer
+            only_fields = ('id', 'name')
+
+        viewset = OnlyEndpoint().get_viewset()
+        self.assertEqual(viewset.read_queryset.query.deferred_loading, ({'id', 'name'}, False))
+        self.assertEqual(viewset.queryset.query.deferred_loading, (frozenset(), True))
+
+    def test_override_and_opt_out(self):
+        queryset = Endpoint(model=Category, serializer=NestedCategorySerializer).get_viewset().queryset
+        self.assertEqual(self.get_lookups(queryset)[1], ['products', 'products__category', 'products__chosen'])
+
+        class OverriddenEndpoint(Endpoint):
+            model = Category
+            serializer = NestedCategorySerializer
+            prefetch_related = ('products', )
+
+        self.assertEqual(self.get_lookups(OverriddenEndpoint().get_viewset().queryset), ([], ['products']))
+
+        class OptedOutEndpoint(Endpoint):
+            model = Category
+            optimize_queryset = False
+
+        self.assertEqual(self.get_lookups(OptedOutEndpoint().get_viewset().queryset), ([], []))
+
+
+class RegistrationProfilerTestCase(TestCase):
+
+    def setUp(self):
+        registration_profiler.clear()
+
+    def tearDown(self):
+        registration_profiler.clear()
+
+    def test_disabled(self):
+        EndpointRouter().register(endpoint=Endpoint(model=Category))
+        self.assertEqual(registration_profiler.report(), [])
+
+    @override_settings(DRF_AUTO_PROFILE_REGISTRATION=True)
+    def test_phases(self):
+        EndpointRouter().register(endpoint=Endpoint(model=Category))
+        report = registration_profiler.report()
+        self.assertEqual([item['endpoint'] for item in report],
+                         ['drf_auto_endpoint.endpoints.Endpoint (sample.Category)'])
+        for phase in ('serializer_factory', 'viewset_factory', 'register'):
+            self.assertGreater(report[0]['phases'][phase], 0)
+
+    @override_settings(DRF_AUTO_PROFILE_REGISTRATION=True)
+    def test_nested_phases_are_counted_once(self):
+        with registration_profiler.measure('outer', 'register'):
+            with registration_profiler.measure('inner', 'viewset_factory'):
+                time.sleep(0.01)
+        report = {item['endpoint']: item for item in registration_profiler.report()}
+        self.assertGreaterEqual(report['inner']['total'], 0.01)
+        self.assertLess(report['outer']['total'], 0.01)
+
+    @override_settings(DRF_AUTO_PROFILE_REGISTRATION=True)
+    def test_command(self):
+        registration_profiler.add('sample.endpoints.Slow', 'register', 0.2)
+        registration_profiler.add('sample.endpoints.Fast', 'register', 0.1)
+        target = os.path.join(tempfile.mkdtemp(), 'report.json')
+        stdout = StringIO()
+
+        call_command('profile_registration', json=target, stdout=stdout)
+        output = stdout.getvalue()
+        self.assertLess(output.index('sample.endpoints.Slow'), output.index('sample.endpoints.Fast'))
+        with open(target) as f:
+            self.assertEqual([item['endpoint'] for item in json.load(f)],
+                             ['sample.endpoints.Slow', 'sample.endpoints.Fast'])
+        shutil.rmtree(os.path.dirname(target))
+
+
+class FieldsetsStoreTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'fieldsets.json')
+        self.write({'Product': ['name'], 'Broken': 'name'})
+        self.store = FieldsetsStore()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, content, mtime=None):
+        with open(self.path, 'w') as f:
+            json.dump(content, f)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_files_are_parsed_once(self):
+        with mock.patch('drf_auto_endpoint.fieldsets.json.load', wraps=json.load) as load:
+            self.assertEqual(self.store.get(self.path, 'Product'), ['name'])
+            self.assertIsNone(self.store.get(self.path, 'Category'))
+            self.assertEqual(load.call_count, 1)
+
+        self.assertIsNone(self.store.get(os.path.join(self.directory, 'missing.json'), 'Product'))
+
+    def test_revalidation_in_debug(self):
+        self.store.get(self.path, 'Product')
+        self.write({'Product': ['category']}, mtime=1)
+        self.assertEqual(self.store.get(self.path, 'Product'), ['name'])
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.store.get(self.path, 'Product'), ['category'])
+
+    def test_malformed_keys_are_reported_once(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.store.get(self.path, 'Broken')
+            self.store.get(self.path, 'Broken')
+            self.store.get(self.path, 'Category', required=True)
+            self.store.get(self.path, 'Category', required=True)
+            self.store.get(self.path, 'Category')
+        self.assertEqual(len(caught), 2)
+
 
 class ViewSetFactoryTestCase(TestCase):
 
@@ -248,6 +585,16 @@ class ViewSetFactoryTestCase(TestCase):
 
 class UtilsTestCase(TestCase):
 
+    def test_shared_inflector(self):
+        inflector = get_inflector()
+        self.assertIs(inflector, get_inflector('inflector.English'))
+        self.assertIs(Endpoint(model=Category).inflector, inflector)
+
+        inflector.pluralize.cache_clear()
+        self.assertEqual(inflector.pluralize('category'), 'categories')
+        self.assertEqual(inflector.pluralize('category'), 'categories')
+        self.assertEqual(inflector.pluralize.cache_info().hits, 1)
+
     def test_validation_attrs(self):
         data = (
             (CharField(), {}),
@@ -269,6 +616,76 @@ class UtilsTestCase(TestCase):
                                  input_field
                              ))
 
+    def test_field_dict_is_compiled_once(self):
+        endpoint = Endpoint(model=Product)
+        endpoint.foreign_key_as_list = True
+        serializer_instance = endpoint.get_serializer()()
+        Category.objects.create(name='first')
+
+        with mock.patch.object(utils.get_field_dict, 'compile_field',
+                               wraps=utils.get_field_dict.compile_field) as compile_field:
+            first = endpoint._get_field_dict('category', serializer_instance)
+            Category.objects.create(name='second')
+            second = endpoint._get_field_dict('category', serializer_instance)
+            self.assertEqual(compile_field.call_count, 1)
+
+        self.assertEqual([choice['label'] for choice in first['choices']], ['first'])
+        self.assertEqual([choice['label'] for choice in second['choices']], ['first', 'second'])
+
+        # produced dicts are independent from each other
+        first['ui']['label'] = 'changed'
+        self.assertNotEqual(endpoint._get_field_dict('category', serializer_instance)['ui']['label'], 'changed')
+
+    def test_queryset_choices_are_a_list(self):
+        category = Category.objects.create(name='first')
+        rv = {}
+        utils.get_field_dict.set_choices_from_qs(rv, Category.objects)
+
+        # as seen by update_* hooks
+        self.assertIsInstance(rv['choices'], list)
+        self.assertEqual(len(rv['choices']), 1)
+        self.assertEqual(rv['choices'][0], {'label': 'first', 'value': category.pk})
+        self.assertEqual(json.loads(json.dumps(rv['choices'])), [{'label': 'first', 'value': category.pk}])
+
+    def test_field_dict_of_dynamic_serializer(self):
+        class HelpSerializer(DummyProductSerializer):
+            def __init__(self, *args, **kwargs):
+                super(HelpSerializer, self).__init__(*args, **kwargs)
+                self.fields['name'].help_text = self.context['help']
+
+        self.assertEqual(utils.get_field_dict('name', HelpSerializer(context={'help': 'a'}))['ui']['help'], 'a')
+        self.assertEqual(utils.get_field_dict('name', HelpSerializer(context={'help': 'b'}))['ui']['help'], 'b')
+
+    def test_field_dict_callable_default(self):
+        counter = {'count': 0}
+
+        def default():
+            counter['count'] += 1
+            return counter['count']
+
+        class DefaultSerializer(DummyProductSerializer):
+            name = CharField(default=default)
+
+        self.assertEqual(utils.get_field_dict('name', DefaultSerializer())['default'], 1)
+        self.assertEqual(utils.get_field_dict('name', DefaultSerializer())['default'], 2)
+
+    def test_widget_resolution(self):
+        class MoneyField(DecimalField):
+            pass
+
+        class SmallMoneyField(MoneyField):
+            pass
+
+        self.assertEqual(get_widget(MoneyField), 'number')
+        self.assertEqual(get_widget(SerializerMethodField), settings.DEFAULT_WIDGET)
+        self.assertIsNone(get_widget.resolve(SerializerMethodField))
+
+        with override_settings(DRF_AUTO_WIDGET_MAPPING={'MoneyField': 'money'}):
+            self.assertEqual(get_widget(SmallMoneyField), 'money')
+            self.assertEqual(get_widget(DecimalField), 'number')
+        self.assertEqual(get_widget(SmallMoneyField), 'number')
+        self.assertNotIn('MoneyField', settings.WIDGET_MAPPING)
+
     def test_action_kwargs(self):
         def test_func():
             pass
@@ -11,8 +11,8 @@ os.chdir(os.path.normpath(os.path.join(os.path.abspath(__file__), os.pardir)))
 setup(
     name='drf-schema-adapter',
     version='3.0.6',
-    packages=['drf_auto_endpoint', 'export_app', 'export_app.management',
-              'export_app.management.commands'],
+    packages=['drf_auto_endpoint', 'drf_auto_endpoint.management', 'drf_auto_endpoint.management.commands',
+              'export_app', 'export_app.management', 'export_app.management.commands'],
     include_package_data=True,
     license='MIT License',
     description='Making using Django with frontend libraries and frameworks DRYer',